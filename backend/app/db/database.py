@@ -1,4 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from logging import getLogger
@@ -7,13 +9,126 @@ logger = getLogger(__name__)
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set")
+# Optional separate database for reads (e.g. a replica); defaults to DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", DATABASE_URL)
 
-logger.info(f"Database used is {DATABASE_URL}")
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Connection pool sizing, per engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 10))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds; server-side idle timeouts close older connections
+# Driver used when a URL names only the backend (postgresql:// would otherwise mean psycopg2)
+SYNC_DRIVERS = {"postgresql": "psycopg"}
+# Async drivers used for the AsyncSession engine, by database backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# PostgreSQL session settings
+PG_CONNECT_TIMEOUT = int(os.getenv("PG_CONNECT_TIMEOUT", 10))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", 0))  # 0 means no limit
+
+# SQLite pragmas applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # readers never block the writer
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # durable in WAL mode, fsync at checkpoints only
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))  # wait for the write lock instead of failing
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def is_postgresql(url: str) -> bool:
+    return make_url(url).get_backend_name() == "postgresql"
+
+
+def sqlite_pragmas(read_only: bool = False):
+    """Connect listener applying the SQLITE_* pragmas; read-only connections also refuse writes."""
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # negative means KiB, not pages
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA temp_store={SQLITE_TEMP_STORE}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return on_connect
+
+
+def sync_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = SYNC_DRIVERS.get(parsed.drivername)
+    if driver is None:
+        return url
+    return parsed.set(drivername=f"{parsed.drivername}+{driver}").render_as_string(hide_password=False)
+
+
+def async_url(url: str) -> str:
+    """The same database addressed through its async driver (sqlite -> aiosqlite, postgresql -> asyncpg)."""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver configured for {parsed.get_backend_name()}")
+    return parsed.set(drivername=f"{parsed.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def engine_options(url: str, pool_size: int, read_only: bool = False, is_async: bool = False) -> dict:
+    """Pool and connect arguments for the database behind url."""
+    kwargs = {"pool_pre_ping": True}
+    if is_sqlite(url):
+        kwargs["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    elif is_postgresql(url):
+        kwargs["pool_recycle"] = DB_POOL_RECYCLE
+        settings = {}
+        if read_only:
+            settings["default_transaction_read_only"] = "on"
+        if PG_STATEMENT_TIMEOUT_MS:
+            settings["statement_timeout"] = str(PG_STATEMENT_TIMEOUT_MS)
+        if is_async:
+            kwargs["connect_args"] = {"timeout": PG_CONNECT_TIMEOUT, "server_settings": settings}
+        else:
+            kwargs["connect_args"] = {"connect_timeout": PG_CONNECT_TIMEOUT}
+            if settings:
+                kwargs["connect_args"]["options"] = " ".join(f"-c {key}={value}" for key, value in settings.items())
+    if make_url(url).database not in (None, "", ":memory:"):
+        # In-memory SQLite uses a single shared connection and takes no pool options
+        kwargs.update(pool_size=pool_size, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return kwargs
+
+
+def make_engine(url: str, pool_size: int = DB_POOL_SIZE, read_only: bool = False):
+    """Create an engine with pool sizing and the per-dialect tuning (pragmas for SQLite)."""
+    new_engine = create_engine(sync_url(url), **engine_options(url, pool_size, read_only))
+    if is_sqlite(url):
+        event.listen(new_engine, "connect", sqlite_pragmas(read_only))
+    return new_engine
+
+
+def make_async_engine(url: str, pool_size: int = DB_POOL_SIZE, read_only: bool = False):
+    """Async counterpart of make_engine, for AsyncSession handlers."""
+    new_engine = create_async_engine(async_url(url), **engine_options(url, pool_size, read_only, is_async=True))
+    if is_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", sqlite_pragmas(read_only))
+    return new_engine
+
+
+logger.info(f"Database used is {make_url(DATABASE_URL).render_as_string(hide_password=True)}")
+engine = make_engine(DATABASE_URL)
+# Separate pool for GET endpoints, so reads never queue behind write connections
+read_engine = make_engine(DATABASE_READ_URL, pool_size=DB_READ_POOL_SIZE, read_only=True)
+
+# Async reads run on the event loop instead of occupying a threadpool thread per request
+async_read_engine = make_async_engine(DATABASE_READ_URL, pool_size=DB_READ_POOL_SIZE, read_only=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession,
+                                           autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -23,3 +138,16 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def get_read_db():
+    """Session on the read-only pool, for handlers that never write."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db():
+    """AsyncSession on the read-only pool, for async handlers that never write."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
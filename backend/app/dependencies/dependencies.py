@@ -3,7 +3,7 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.db.database import get_db
 from app.models.user_model import User
-from app.security.auth import decode_access_token
+from app.services.user_cache import cache_user, decode_token, get_user
 from jose import jwt
 import logging
 logger = logging.getLogger(__name__)
@@ -27,7 +27,7 @@ def get_current_user(token: str = Depends(oauth2_scheme),
     # Extracts user information from the JWT token and retrieves the corresponding User from the database.
     """
     # logger.info(f"Decoding token: {token}")
-    payload = decode_access_token(token)
+    payload = decode_token(token)
     # logger.info(f"Token {token} payload: {payload}")
 
     if not payload:
@@ -41,12 +41,18 @@ def get_current_user(token: str = Depends(oauth2_scheme),
                             detail="Invalid token payload1")
 
 
-    user = db.query(User).filter(User.username == username).first()
-    if not user:
-        logger.info(f"User not found for username: {username}")
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="User not found")
-    return user
+    user = get_user(username)
+    if user is None:
+        user = db.query(User).filter(User.username == username).first()
+        if not user:
+            logger.info(f"User not found for username: {username}")
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                detail="User not found")
+        # The cached copy is shared between requests, so it never belongs to a session
+        db.expunge(user)
+        cache_user(user)
+    # Attach a per-request copy without querying again
+    return db.merge(user, load=False)
 
 def require_admin(current_user : User = Depends(get_current_user)) -> User:
     """
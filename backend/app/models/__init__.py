@@ -1,7 +1,9 @@
 from .task_model import Task
+from .task_tombstone_model import TaskTombstone
 from .user_model import User
 from .poll_model import Poll
 from .cleanse.image_model import Image
 from .cleanse.image_analysis_model import ImageAnalysis
 from .cleanse.image_duplicate_group_model import ImageDuplicateGroup
-from .cleanse.image_folder_model import ImageFolder
\ No newline at end of file
+from .cleanse.image_folder_model import ImageFolder
+from .cleanse.image_hash_band_model import ImageHashBand
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
@@ -16,4 +16,9 @@ class ImageDuplicateGroup(Base):
     hash_distance = Column(Integer)
     image = relationship("Image", back_populates="duplicates")
 
+    # The primary key leads with group_id; detection and pruning look rows up by image
+    __table_args__ = (
+        Index("ix_image_duplicate_groups_image_id", "image_id"),
+    )
+
     
\ No newline at end of file
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, ForeignKey, Index
+from app.db.database import Base
+
+class ImageHashBand(Base):
+    """
+    One row per (image, band): the pHash split into HASH_BANDS fixed bit ranges.
+    Two hashes within k bits of each other share at least one band value when
+    k < HASH_BANDS, so near-duplicate candidates are an indexed equality lookup.
+    """
+    __tablename__ = "image_hash_bands"
+
+    image_id = Column(
+        Integer,
+        ForeignKey("images.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+    band = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_image_hash_bands_band_value", "band", "value"),
+    )
@@ -1,20 +1,43 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 
 from sqlalchemy.sql import func
 from app.db.database import Base
 
+# Laplacian variance below which an image is blurry. Police measures it on images downscaled
+# to SCAN_DECODE_SIZE (1024px), so keep this in step with BLUR_THRESHOLD in cleanse/app/scan.py
+BLUR_THRESHOLD = 50
+
 class Image(Base):
     __tablename__ = "images"
 
     id = Column(Integer, primary_key=True, index=True)
     path = Column(String, unique=True, index=True)
     hash = Column(String, index=True)
+    checksum = Column(String, index=True, nullable=True)  # content checksum, equal for byte-identical files
     blur_score = Column(Float, nullable=True)  # new column
     has_face = Column(Boolean, default=True)   # new column
+    folder_id = Column(Integer, ForeignKey("image_folders.id"), nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    file_size = Column(Integer, nullable=True)
+    modified_at = Column(DateTime, nullable=True)
 
     duplicates = relationship("ImageDuplicateGroup", back_populates="image", cascade="all, delete-orphan")
 
+    # Partial indexes for the /images/blurred and /images/no-face keyset pages, which
+    # walk id order over a small slice of the table. Queries must repeat the WHERE
+    # with literal values (not bound parameters) for the planner to pick them.
+    __table_args__ = (
+        # Named after its threshold, so autoupgrade builds a new one when the threshold changes
+        Index(f"ix_images_blurred_{BLUR_THRESHOLD}_id", "id",
+              sqlite_where=text(f"blur_score < {BLUR_THRESHOLD}"),
+              postgresql_where=text(f"blur_score < {BLUR_THRESHOLD}")),
+        Index("ix_images_no_face_id", "id",
+              sqlite_where=text("has_face = 0"),
+              postgresql_where=text("has_face = false")),
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
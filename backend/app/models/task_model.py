@@ -13,7 +13,7 @@ class Task(Base):
     task_notes = Column(String, nullable=True)
     completed = Column(Boolean, default=False)
     assigned_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    last_updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     last_updated_by = Column(String, nullable=True)
     
     # relationship
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, DateTime
+from datetime import datetime
+from app.db.database import Base
+
+class TaskTombstone(Base):
+    """
+    Marker left by delete_task so delta sync (/task/changes) can tell clients
+    which tasks to drop. Kept for TASK_TOMBSTONE_RETENTION_DAYS.
+    """
+    __tablename__ = "task_tombstones"
+
+    task_id = Column(Integer, primary_key=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
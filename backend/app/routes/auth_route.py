@@ -3,10 +3,11 @@ from fastapi import APIRouter, Depends, status, HTTPException
 from app.models import User, Task
 from typing import List
 from app.schemas.user_schema import LoginRequest, RegisterRequest, UserOut, RoleUpdateRequest
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from app.security.auth import verify_password, create_access_token, hash_password, decode_access_token
+from app.services.user_cache import invalidate_user
 from fastapi.security import OAuth2PasswordBearer
 import logging
 logger = logging.getLogger(__name__)
@@ -45,10 +46,11 @@ def register(req: RegisterRequest, db: Session = Depends(get_db)):
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_user(user.username)
     return user
 
 @auth_router.get("/users", response_model=List[UserOut])
-def get_users(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+def get_users(db: Session = Depends(get_read_db), token: str = Depends(oauth2_scheme)):
     try:
         payload = decode_access_token(token)
         if payload["role"] != "admin":
@@ -70,4 +72,5 @@ def update_role(req: RoleUpdateRequest, db: Session = Depends(get_db), token: st
     user.role = req.role
     db.commit()
     db.refresh(user)
+    invalidate_user(user.username)
     return {"msg": f"{user.username} role updated to {user.role}"}
\ No newline at end of file
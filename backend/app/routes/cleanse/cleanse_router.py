@@ -1,16 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import false, func, literal, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import List, Optional
+import zlib
 
-from app.db.database import get_db
-from app.schemas.cleanse.image_police_schema import ImageDataset, ImageDatasetItem
+from app.db.database import get_db, get_read_db, get_async_read_db
+from app.schemas.cleanse.image_police_schema import ImageDataset, ImageDatasetItem, ImagePruneRequest
+from app.schemas.cleanse.image_duplicate_schema import DuplicateDetectRequest
 from app.models.cleanse.image_model import Image
-from app.models.cleanse.image_analysis_model import ImageAnalysis
 from app.models.cleanse.image_folder_model import ImageFolder
 from app.models.cleanse.image_duplicate_group_model import ImageDuplicateGroup
+from app.services.duplicates import detect_duplicates, DUPLICATE_HASH_THRESHOLD
+from app.services.ingest import ingest_images, insert_missing, iter_ndjson_chunks, BLUR_THRESHOLD
+from app.services.prune import prune_images
+from app.utils.gzip_route import GzipRoute
 
-cleanse_router = APIRouter(prefix="/cleanse", tags=["cleanse"])
+# Police may gzip its JSON reports (Content-Encoding: gzip)
+cleanse_router = APIRouter(prefix="/cleanse", tags=["cleanse"], route_class=GzipRoute)
 
 
 @cleanse_router.post("/image-dataset")
@@ -32,57 +41,26 @@ def report_image_dataset(dataset: ImageDataset, db: Session = Depends(get_db)):
             image_count=len(dataset.images)
         )
         db.add(folder)
-        db.commit()
-        db.refresh(folder)
+        db.flush()
     else:
         folder.last_policed_at = now
         folder.last_reported_at = now
         folder.image_count = len(dataset.images)
-        db.commit()
-
-    # 2️⃣ Process each image
-    for item in dataset.images:
-        # Upsert Image
-        image = db.query(Image).filter(Image.path == item.path).first()
-        if not image:
-            image = Image(
-                path=item.path,
-                folder_id=folder.id,
-                width=item.width,
-                height=item.height,
-                file_size=item.file_size,
-                modified_at=now
-            )
-            db.add(image)
-            db.commit()
-            db.refresh(image)
-        else:
-            # Update metadata if changed
-            image.width = item.width
-            image.height = item.height
-            image.file_size = item.file_size
-            db.commit()
-
-        # Upsert ImageAnalysis
-        analysis = db.query(ImageAnalysis).filter(ImageAnalysis.image_id == image.id).first()
-        if not analysis:
-            analysis = ImageAnalysis(
-                image_id=image.id,
-                phash=item.phash,
-                has_face=1 if item.has_face else 0,
-                is_blurry=1 if item.blur_score < 100 else 0,  # Phase-1 threshold
-                blur_score=item.blur_score,
-                analyzed_at=now
-            )
-            db.add(analysis)
-        else:
-            # Update if needed
-            analysis.phash = item.phash
-            analysis.has_face = 1 if item.has_face else 0
-            analysis.is_blurry = 1 if item.blur_score < 100 else 0
-            analysis.blur_score = item.blur_score
-            analysis.analyzed_at = now
 
+    # 2️⃣ Bulk upsert images and their analysis, committed together with the folder
+    result = ingest_images(db, [
+        {
+            "path": item.path,
+            "hash": item.phash,
+            "blur_score": item.blur_score,
+            "has_face": item.has_face,
+            "checksum": item.checksum,
+            "width": item.width,
+            "height": item.height,
+            "file_size": item.file_size,
+        }
+        for item in dataset.images
+    ], analysis=True, folder_id=folder.id)
     db.commit()
 
     # 3️⃣ Optionally, trigger duplicate rebuild (global)
@@ -91,10 +69,11 @@ def report_image_dataset(dataset: ImageDataset, db: Session = Depends(get_db)):
     # from app.services.duplicates import rebuild_duplicates
     # rebuild_duplicates(db)
 
-    return {"status": "success", "folder": dataset.folder, "images_processed": len(dataset.images)}
+    return {"status": "success", "folder": dataset.folder, "images_processed": len(dataset.images),
+            "batches": result["batches"]}
 
 @cleanse_router.get("/images/metadata")
-def get_image_metadata(paths: Optional[str] = Query(None), db: Session = Depends(get_db)):
+def get_image_metadata(paths: Optional[str] = Query(None), db: Session = Depends(get_read_db)):
 
     """
     Returns image metadata for all images or filtered by comma-separated paths.
@@ -121,23 +100,71 @@ def get_image_metadata(paths: Optional[str] = Query(None), db: Session = Depends
     
     return {"images": results}
 
+IMAGE_FIELDS = ("id", "path", "hash", "blur_score", "has_face")
+IMAGE_PAGE_SIZE = 500
+IMAGE_PAGE_MAX = 5000
+
+async def list_images(db: AsyncSession, after_id: Optional[int], limit: int, fields: Optional[str],
+                      has_face: Optional[bool] = None, max_blur: Optional[float] = None,
+                      min_blur: Optional[float] = None) -> dict:
+    """
+    One keyset page of images ordered by id, with only the requested fields.
+    next_cursor is the after_id for the following page, or None on the last page.
+    """
+    selected = ["id"]
+    for field in (fields.split(",") if fields else IMAGE_FIELDS):
+        field = field.strip()
+        if field not in IMAGE_FIELDS:
+            raise HTTPException(status_code=400, detail=f"Unknown field '{field}'")
+        if field not in selected:
+            selected.append(field)
+
+    query = select(*[getattr(Image, field) for field in selected])
+    if after_id is not None:
+        query = query.where(Image.id > after_id)
+    # Filters are rendered as literals so they can match the partial indexes on images
+    if has_face is not None:
+        query = query.where(Image.has_face == (true() if has_face else false()))
+    if max_blur is not None:
+        query = query.where(Image.blur_score < literal(max_blur, literal_execute=True))
+    if min_blur is not None:
+        query = query.where(Image.blur_score >= min_blur)
+    rows = (await db.execute(query.order_by(Image.id).limit(limit))).all()
+
+    return {
+        "images": [dict(zip(selected, row)) for row in rows],
+        "next_cursor": rows[-1][0] if len(rows) == limit else None,
+    }
+
 @cleanse_router.get("/images")
-def get_all_images(db: Session = Depends(get_db)):
-    images = db.query(Image).all()
-    return {"images": [img.to_dict() for img in images]}  # implement to_dict() in model
+async def get_all_images(after_id: Optional[int] = Query(None),
+                         limit: int = Query(IMAGE_PAGE_SIZE, ge=1, le=IMAGE_PAGE_MAX),
+                         fields: Optional[str] = Query(None, description="Comma-separated subset of image fields"),
+                         has_face: Optional[bool] = Query(None),
+                         max_blur: Optional[float] = Query(None),
+                         min_blur: Optional[float] = Query(None),
+                         db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Page through images with keyset pagination: pass next_cursor back as after_id.
+    """
+    return await list_images(db, after_id, limit, fields, has_face, max_blur, min_blur)
 
 @cleanse_router.get("/images/no-face")
-def get_no_face_images(db: Session = Depends(get_db)):
-    images = db.query(Image).filter(Image.has_face == False).all()
-    return {"images": [img.to_dict() for img in images]}
+async def get_no_face_images(after_id: Optional[int] = Query(None),
+                             limit: int = Query(IMAGE_PAGE_SIZE, ge=1, le=IMAGE_PAGE_MAX),
+                             fields: Optional[str] = Query(None),
+                             db: AsyncSession = Depends(get_async_read_db)):
+    return await list_images(db, after_id, limit, fields, has_face=False)
 
 @cleanse_router.get("/images/blurred")
-def get_blurred_images(db: Session = Depends(get_db)):
-    images = db.query(Image).filter(Image.blur_score < 100).all()  # threshold example
-    return {"images": [img.to_dict() for img in images]}
+async def get_blurred_images(after_id: Optional[int] = Query(None),
+                             limit: int = Query(IMAGE_PAGE_SIZE, ge=1, le=IMAGE_PAGE_MAX),
+                             fields: Optional[str] = Query(None),
+                             db: AsyncSession = Depends(get_async_read_db)):
+    return await list_images(db, after_id, limit, fields, max_blur=BLUR_THRESHOLD)
 
 @cleanse_router.get("/images/metadata")
-def get_image_metadata(paths: Optional[str] = Query(None), db: Session = Depends(get_db)):
+def get_image_metadata(paths: Optional[str] = Query(None), db: Session = Depends(get_read_db)):
     query = db.query(Image)
     if paths:
         path_list = paths.split(",")
@@ -149,22 +176,43 @@ def get_image_metadata(paths: Optional[str] = Query(None), db: Session = Depends
 def report_images(images: List[dict], db: Session = Depends(get_db)):
     """
     Police reports features: hash, blur_score, has_face
+    Returns the ids of the reported images so duplicates can be detected for them.
     """    
-    for img in images:
-        existing = db.query(Image).filter_by(path=img["path"]).first()
-        if existing:
-            existing.hash = img["hash"]
-            existing.blur_score = img["blur_score"]
-            existing.has_face = img["has_face"]
-        else:
-            db.add(Image(
-                path=img["path"],
-                hash=img["hash"],
-                blur_score=img["blur_score"],
-                has_face=img["has_face"]
-            ))
+    result = ingest_images(db, images)
     db.commit()
-    return {"status": "success", "count": len(images)}
+    return {"status": "success", "count": len(images), **result}
+
+@cleanse_router.post("/images/report/stream")
+async def report_images_stream(request: Request, db: Session = Depends(get_db)):
+    """
+    Streaming variant of /images/report for large folders.
+    Body is newline-delimited JSON, one image per line, optionally gzip
+    compressed (Content-Encoding: gzip). Records are upserted in batches as
+    they arrive and committed together once the body is complete.
+    """
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    ids = []
+    batches = []
+    try:
+        async for chunk in iter_ndjson_chunks(request.stream(), gzipped):
+            result = await run_in_threadpool(ingest_images, db, chunk)
+            ids.extend(result["ids"])
+            batches.extend(result["batches"])
+        await run_in_threadpool(db.commit)
+    except (ValueError, KeyError, zlib.error) as e:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=400, detail=f"Invalid report stream: {e}")
+    return {"status": "success", "count": len(ids), "ids": ids, "batches": batches}
+
+@cleanse_router.post("/images/prune")
+def prune_reported_images(req: ImagePruneRequest, db: Session = Depends(get_db)):
+    """
+    Police reports images that were deleted or moved on disk.
+    Deleted images are removed with their analysis, hash bands and duplicate
+    group rows; moved images keep their id and only change path.
+    """
+    result = prune_images(db, req.deleted, [move.model_dump() for move in req.moved])
+    return {"status": "success", **result}
 
 @cleanse_router.post("/images/duplicates")
 def report_duplicates(groups: List[dict], db: Session = Depends(get_db)):
@@ -178,16 +226,56 @@ def report_duplicates(groups: List[dict], db: Session = Depends(get_db)):
         "hash_distance": int    # optional
     }
     """
-    for g in groups:
-        existing = db.query(ImageDuplicateGroup).filter_by(
-            group_id=g["group_id"], image_id=g["image_id"]
-        ).first()
-        if not existing:
-            db.add(ImageDuplicateGroup(
-                group_id=g["group_id"],
-                image_id=g["image_id"],
-                is_primary=g.get("is_primary", 0),
-                hash_distance=g.get("hash_distance", 0)
-            ))
+    insert_missing(db, ImageDuplicateGroup, [
+        {
+            "group_id": g["group_id"],
+            "image_id": g["image_id"],
+            "is_primary": g.get("is_primary", 0),
+            "hash_distance": g.get("hash_distance", 0),
+        }
+        for g in groups
+    ])
     db.commit()
-    return {"status": "success", "count": len(groups)}
\ No newline at end of file
+    return {"status": "success", "count": len(groups)}
+
+@cleanse_router.get("/images/duplicates/exact")
+async def get_exact_duplicates(after: Optional[str] = Query(None, description="Checksum cursor from the previous page"),
+                               limit: int = Query(IMAGE_PAGE_SIZE, ge=1, le=IMAGE_PAGE_MAX),
+                               db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Byte-identical images, grouped by content checksum (ordered by checksum).
+    """
+    query = (select(Image.checksum)
+             .where(Image.checksum.isnot(None))
+             .group_by(Image.checksum)
+             .having(func.count(Image.id) > 1)
+             .order_by(Image.checksum))
+    if after is not None:
+        query = query.where(Image.checksum > after)
+    checksums = list((await db.execute(query.limit(limit))).scalars())
+
+    groups = {checksum: [] for checksum in checksums}
+    if checksums:
+        rows = await db.execute(select(Image.id, Image.path, Image.checksum)
+                                .where(Image.checksum.in_(checksums))
+                                .order_by(Image.id))
+        for image_id, path, checksum in rows:
+            groups[checksum].append({"id": image_id, "path": path})
+    return {
+        "groups": [{"checksum": checksum, "images": images} for checksum, images in groups.items()],
+        "next_cursor": checksums[-1] if len(checksums) == limit else None,
+    }
+
+@cleanse_router.post("/images/duplicates/detect")
+def detect_image_duplicates(req: DuplicateDetectRequest, db: Session = Depends(get_db)):
+    """
+    Group the given images with their near-duplicates across the whole library
+    and write image_duplicate_groups in one transaction.
+    Without image_ids every group is rebuilt from scratch.
+    """
+    threshold = DUPLICATE_HASH_THRESHOLD if req.threshold is None else req.threshold
+    try:
+        result = detect_duplicates(db, req.image_ids, threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", **result}
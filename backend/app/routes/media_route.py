@@ -1,10 +1,17 @@
 from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
 from starlette.requests import Request
 from pathlib import Path
+import asyncio
 import os
 import mimetypes
-from PIL import Image, ExifTags
+from typing import Optional
+from app.services.thumbnails import ThumbnailService, THUMBNAIL_VARIANTS
+from app.services.ranged_file import ranged_file_response
+from app.services.media_index import DirectoryIndex
+import logging
+logger = logging.getLogger(__name__)
 
 media_router = APIRouter(prefix="/media", tags=["media"])
 
@@ -18,7 +25,8 @@ THUMBNAIL_DIR.mkdir(exist_ok=True, parents=True)
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
 VIDEO_EXTS = {".mp4", ".mkv", ".avi", ".mov"}
 
-THUMBNAIL_SIZE = (300, 300)  # small resolution for faster loading
+thumbnail_service = ThumbnailService(MEDIA_ROOT, THUMBNAIL_DIR)
+directory_index = DirectoryIndex(IMAGE_EXTS, VIDEO_EXTS)
 
 # ---------------------------------------------------
 # Utilities
@@ -29,49 +37,29 @@ def safe_resolve(relative_path: str) -> Path:
         raise HTTPException(status_code=403, detail="Invalid path")
     return resolved
 
-def generate_thumbnail(file_path: Path, thumb_path: Path, size=THUMBNAIL_SIZE):
-    """Create a thumbnail with EXIF orientation fix."""
-    img = Image.open(file_path)
-
-    # Fix orientation according to EXIF
-    try:
-        for orientation in ExifTags.TAGS.keys():
-            if ExifTags.TAGS[orientation] == "Orientation":
-                break
-        exif = img._getexif()
-        if exif is not None:
-            orientation_value = exif.get(orientation)
-            if orientation_value == 3:
-                img = img.rotate(180, expand=True)
-            elif orientation_value == 6:
-                img = img.rotate(270, expand=True)
-            elif orientation_value == 8:
-                img = img.rotate(90, expand=True)
-    except Exception:
-        pass  # ignore if no EXIF
-
-    img.thumbnail(size)
-    thumb_path.parent.mkdir(parents=True, exist_ok=True)
-    img.save(thumb_path)
-
 # ---------------------------------------------------
 # 1️⃣ Browse folders & media
 # ---------------------------------------------------
 @media_router.get("/browse")
-def browse_media(path: str = Query(default="")):
+def browse_media(response: Response,
+                 path: str = Query(default=""),
+                 sort: str = Query(default="name", pattern="^(name|date|size)$"),
+                 order: str = Query(default="asc", pattern="^(asc|desc)$"),
+                 offset: int = Query(default=0, ge=0),
+                 limit: Optional[int] = Query(default=None, ge=1)):
+    """
+    List a folder's subfolders, images and videos with size and mtime.
+    Served from the directory index cache; the total entry count is returned
+    in X-Total-Count so clients can page with offset/limit.
+    """
     base_path = safe_resolve(path)
     if not base_path.exists() or not base_path.is_dir():
         raise HTTPException(status_code=404, detail="Folder not found")
 
-    items = []
-    for item in sorted(base_path.iterdir()):
-        if item.is_dir():
-            items.append({"name": item.name, "type": "folder"})
-        elif item.suffix.lower() in IMAGE_EXTS:
-            items.append({"name": item.name, "type": "image"})
-        elif item.suffix.lower() in VIDEO_EXTS:
-            items.append({"name": item.name, "type": "video"})
-    return items
+    items = directory_index.list(base_path, sort, order == "desc")
+    response.headers["X-Total-Count"] = str(len(items))
+    end = None if limit is None else offset + limit
+    return items[offset:end]
 
 # ---------------------------------------------------
 # 2️⃣ Stream image / video
@@ -86,34 +74,85 @@ def stream_media(request: Request, path: str = Query(...)):
     media_type = media_type or "application/octet-stream"
 
     if file_path.suffix.lower() in VIDEO_EXTS:
-        # StreamingResponse for videos
-        return StreamingResponse(open(file_path, "rb"), media_type=media_type)
+        # Videos → byte ranges so players can seek
+        return ranged_file_response(request, file_path, media_type)
 
-    # Images → FileResponse
-    return FileResponse(file_path, media_type=media_type, filename=file_path.name)
+    # Images → same, downloaded under their own name
+    return ranged_file_response(request, file_path, media_type, filename=file_path.name)
 
 # ---------------------------------------------------
 # 3️⃣ Thumbnail endpoint
 # ---------------------------------------------------
-@media_router.get("/thumbnail")
-def get_thumbnail(path: str = Query(...)):
+def start_thumbnail(path: str, size: str):
+    """
+    Blocking half of get_thumbnail: path checks and the cache lookup stat the
+    media share, so they run in the threadpool instead of on the event loop.
+    Returns the source path, its stat and the render future (None for non-image files).
+    """
     file_path = safe_resolve(path)
 
     if not file_path.exists() or not file_path.is_file():
         raise HTTPException(status_code=404, detail="File not found")
 
     if file_path.suffix.lower() not in IMAGE_EXTS:
+        return file_path, None, None
+
+    if size not in THUMBNAIL_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"Unknown size; use one of {list(THUMBNAIL_VARIANTS)}")
+
+    stat = file_path.stat()
+    return file_path, stat, thumbnail_service.get(file_path, size, stat)
+
+@media_router.get("/thumbnail")
+async def get_thumbnail(request: Request, path: str = Query(...), size: str = Query(default="grid")):
+    file_path, stat, future = await run_in_threadpool(start_thumbnail, path, size)
+
+    if future is None:
         # Non-image files → return original file
         media_type, _ = mimetypes.guess_type(str(file_path))
         media_type = media_type or "application/octet-stream"
         return FileResponse(file_path, media_type=media_type, filename=file_path.name)
 
-    # Create thumbnail path inside .thumbnails
-    thumb_path = THUMBNAIL_DIR / f"{file_path.relative_to(MEDIA_ROOT).as_posix().replace('/', '__')}"
-    if not thumb_path.exists():
-        generate_thumbnail(file_path, thumb_path)
-
-    media_type, _ = mimetypes.guess_type(str(thumb_path))
-    media_type = media_type or "image/jpeg"
-
-    return FileResponse(thumb_path, media_type=media_type, filename=file_path.name)
+    # Rendered on the thumbnail process pool; concurrent requests share one render
+    try:
+        thumb_path = await asyncio.wrap_future(future)
+    except Exception:
+        logger.exception("Thumbnail generation failed for %s", file_path)
+        raise HTTPException(status_code=500, detail="Thumbnail generation failed")
+
+    # The cache key (source path, mtime, size, variant) is the thumbnail's version; its own
+    # mtime is the LRU clock and moves whenever a hit is touched
+    thumb_path = Path(thumb_path)
+    return await run_in_threadpool(ranged_file_response, request, thumb_path,
+                                   thumbnail_service.media_type, file_path.name,
+                                   f'"{thumb_path.stem}"', stat.st_mtime)
+
+@media_router.post("/thumbnails/prefetch")
+def prefetch_thumbnails(path: str = Query(default=""), sizes: str = Query(default="grid")):
+    """
+    Pre-generate missing thumbnails for every image in a folder in the background.
+    """
+    folder = safe_resolve(path)
+    if not folder.exists() or not folder.is_dir():
+        raise HTTPException(status_code=404, detail="Folder not found")
+    variants = sizes.split(",")
+    unknown = [v for v in variants if v not in THUMBNAIL_VARIANTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown sizes {unknown}")
+    thumbnail_service.prefetch(folder, IMAGE_EXTS, variants)
+    return {"status": "queued", "folder": path, "sizes": variants}
+
+@media_router.get("/thumbnails/stats")
+def get_thumbnail_stats():
+    """
+    Thumbnail cache hit/miss counters and the cache size as of the last sweep.
+    """
+    return thumbnail_service.get_stats()
+
+@media_router.post("/thumbnails/sweep")
+def sweep_thumbnails():
+    """
+    Start a size-capped LRU eviction sweep of the thumbnail cache.
+    """
+    started = thumbnail_service.sweep_in_background()
+    return {"status": "started" if started else "already running"}
@@ -1,35 +1,218 @@
-from fastapi import APIRouter, Depends, HTTPException
-from app.models import Task
-from typing import List
-from app.schemas.task_schema import TaskCreate, TaskUpdate, TaskResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.models import Task, TaskTombstone
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from app.schemas.task_schema import (TaskCreate, TaskUpdate, TaskResponse, TaskChanges,
+                                     TaskBulkUpdate, TaskBulkDelete, TaskBulkResult, TaskSearchResults)
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from app.db.database import get_db
+from app.db.database import get_db, get_async_read_db
 
 from app.dependencies.dependencies import require_admin, get_current_user
+from app.services.ranged_file import etag_matches
+from app.services.task_events import format_sse, task_event_broker
+from app.services.task_search import SEARCH_DIALECTS, search_task_ids
+import asyncio
+import os
 import logging
 logger = logging.getLogger(__name__)
 
+# Delta sync resends changes from this long before the cursor, so a write stamped
+# before a sync but committed after it is still delivered
+TASK_SYNC_OVERLAP_SECONDS = float(os.getenv("TASK_SYNC_OVERLAP_SECONDS", 5))
+TASK_TOMBSTONE_RETENTION_DAYS = int(os.getenv("TASK_TOMBSTONE_RETENTION_DAYS", 90))
+TASK_SEARCH_PAGE_SIZE = 20
+TASK_SEARCH_PAGE_MAX = 100
+TASK_BULK_MAX = int(os.getenv("TASK_BULK_MAX", 1000))  # items per bulk request
+# Comment line sent on idle event streams so proxies keep the connection open
+TASK_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("TASK_EVENTS_HEARTBEAT_SECONDS", 15))
+
 task_router = APIRouter(prefix="/task", tags=["task"])
 
+TASK_PAGE_MAX = 1000
+
+
+def to_task_response(task: Task) -> TaskResponse:
+    return TaskResponse(
+        id=task.id,
+        title=task.title,
+        completed=task.completed,
+        link_url=task.link_url,
+        notes=task.notes,
+        task_notes=task.task_notes,
+        assigned_user_id=task.assigned_user_id,
+        assigned_user=task.assigned_user,
+        last_updated_at=task.last_updated_at.isoformat() if task.last_updated_at else "",
+        last_updated_by=task.last_updated_by
+    )
+
+
+def naive_utc(value: datetime) -> datetime:
+    """last_updated_at is stored as naive UTC; bring aware datetimes to match."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+async def tasks_etag(db: AsyncSession) -> str:
+    """
+    Version of the whole task collection: row count plus newest last_updated_at.
+    Any create, update or delete changes one of the two (last_updated_at is set on
+    every write, and a delete lowers the count), so the ETag only needs one
+    aggregate query over the last_updated_at index.
+    """
+    count, newest = (await db.execute(select(func.count(Task.id), func.max(Task.last_updated_at)))).one()
+    stamp = int(newest.timestamp() * 1_000_000) if newest else 0
+    return f'"tasks-{count:x}-{stamp:x}"'
+
+
+def record_tombstones(db: Session, task_ids: List[int]):
+    """Leave tombstones for deleted tasks (read by /task/changes) and prune expired ones; caller commits."""
+    now = datetime.utcnow()
+    db.execute(delete(TaskTombstone).where(TaskTombstone.task_id.in_(task_ids)))
+    db.execute(insert(TaskTombstone), [{"task_id": task_id, "deleted_at": now} for task_id in task_ids])
+    db.execute(delete(TaskTombstone)
+               .where(TaskTombstone.deleted_at < now - timedelta(days=TASK_TOMBSTONE_RETENTION_DAYS)))
+
+
+def load_task_responses(db: Session, task_ids: List[int]) -> dict:
+    tasks = db.execute(select(Task).options(joinedload(Task.assigned_user))
+                       .where(Task.id.in_(task_ids))).unique().scalars()
+    return {task.id: to_task_response(task) for task in tasks}
+
+
+def check_bulk_size(items: list):
+    if len(items) > TASK_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {TASK_BULK_MAX} tasks per request")
+
+
 @task_router.get("/tasks", response_model=List[TaskResponse])
-def get_tasks(db: Session = Depends(get_db)):
-    tasks = db.query(Task).options(joinedload(Task.assigned_user)).all()
+async def get_tasks(request: Request, response: Response,
+                    completed: Optional[bool] = Query(None),
+                    assigned_user_id: Optional[int] = Query(None),
+                    updated_since: Optional[datetime] = Query(None, description="Only tasks updated at or after this time (UTC)"),
+                    after_id: Optional[int] = Query(None),
+                    limit: Optional[int] = Query(None, ge=1, le=TASK_PAGE_MAX),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Tasks ordered by id, optionally filtered. With limit the list is one keyset
+    page and the X-Next-Cursor header holds the after_id of the next page.
+    Responses carry an ETag; a poll with a matching If-None-Match gets a bodiless
+    304 without the tasks being loaded.
+    """
+    etag = await tasks_etag(db)
+    # Revalidate on every poll; the browser turns a 304 back into the cached list
+    headers = {"etag": etag, "cache-control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    query = select(Task).options(joinedload(Task.assigned_user))
+    if completed is not None:
+        query = query.where(Task.completed == completed)
+    if assigned_user_id is not None:
+        query = query.where(Task.assigned_user_id == assigned_user_id)
+    if updated_since is not None:
+        query = query.where(Task.last_updated_at >= naive_utc(updated_since))
+    if after_id is not None:
+        query = query.where(Task.id > after_id)
+    query = query.order_by(Task.id)
+    if limit is not None:
+        query = query.limit(limit)
+    result = await db.execute(query)
+    tasks = result.unique().scalars().all()
     logger.debug(tasks)
-    return [
-        TaskResponse(
-            id=task.id,
-            title=task.title,
-            completed=task.completed,
-            link_url=task.link_url,
-            notes=task.notes,
-            task_notes=task.task_notes,
-            assigned_user_id=task.assigned_user_id,
-            assigned_user=task.assigned_user,
-            last_updated_at=task.last_updated_at.isoformat() if task.last_updated_at else "",
-            last_updated_by=task.last_updated_by
-        )
-        for task in tasks
-    ]
+
+    response.headers.update(headers)
+    if limit is not None and len(tasks) == limit:
+        response.headers["x-next-cursor"] = str(tasks[-1].id)
+    return [to_task_response(task) for task in tasks]
+
+@task_router.get("/changes", response_model=TaskChanges)
+async def get_task_changes(since: Optional[str] = Query(None, description="Cursor returned by the previous sync"),
+                           db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Delta sync: tasks created or updated since the cursor, plus the ids of tasks
+    deleted since then (apply deletes first). Without a cursor, or with one older
+    than the tombstone retention, every task is returned with reset=true.
+    Changes from TASK_SYNC_OVERLAP_SECONDS before the cursor are sent again;
+    applying one twice is harmless.
+    """
+    now = datetime.utcnow()
+    start = None
+    if since is not None:
+        try:
+            start = naive_utc(datetime.fromisoformat(since))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if start < now - timedelta(days=TASK_TOMBSTONE_RETENTION_DAYS):
+            start = None  # tombstones from back then may have been pruned
+
+    query = select(Task).options(joinedload(Task.assigned_user)).order_by(Task.id)
+    deleted = []
+    if start is not None:
+        window = start - timedelta(seconds=TASK_SYNC_OVERLAP_SECONDS)
+        query = query.where(Task.last_updated_at > window)
+        deleted = list((await db.execute(select(TaskTombstone.task_id)
+                                         .where(TaskTombstone.deleted_at > window))).scalars())
+    tasks = (await db.execute(query)).unique().scalars().all()
+    return TaskChanges(
+        tasks=[to_task_response(task) for task in tasks],
+        deleted=deleted,
+        cursor=now.isoformat(),
+        reset=start is None,
+    )
+
+@task_router.get("/search", response_model=TaskSearchResults)
+async def search_tasks(q: str = Query(..., min_length=1, description="Words to find; each matches as a prefix"),
+                       limit: int = Query(TASK_SEARCH_PAGE_SIZE, ge=1, le=TASK_SEARCH_PAGE_MAX),
+                       offset: int = Query(0, ge=0),
+                       db: AsyncSession = Depends(get_async_read_db)):
+    """
+    Ranked full-text search over title, notes and task_notes. Pages are by
+    offset, since results are ordered by relevance rather than id.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in SEARCH_DIALECTS:
+        raise HTTPException(status_code=501, detail=f"Task search is not supported on {dialect}")
+    ids = await search_task_ids(db, q, limit, offset)
+    tasks = {}
+    if ids:
+        result = await db.execute(select(Task).options(joinedload(Task.assigned_user)).where(Task.id.in_(ids)))
+        tasks = {task.id: task for task in result.unique().scalars()}
+    return TaskSearchResults(
+        tasks=[to_task_response(tasks[task_id]) for task_id in ids if task_id in tasks],
+        next_offset=offset + limit if len(ids) == limit else None,
+    )
+
+@task_router.get("/events")
+async def stream_task_events(request: Request):
+    """
+    Server-sent events for task changes: "created" and "updated" carry the task,
+    "deleted" carries its id, and "resync" means events were dropped because the
+    client fell behind. After a reconnect or a resync, catch up with /task/changes.
+    """
+    queue = task_event_broker.subscribe()
+
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), TASK_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            task_event_broker.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"cache-control": "no-cache", "x-accel-buffering": "no"})
 
 @task_router.post("/tasks", response_model=TaskResponse, dependencies=[Depends(require_admin)])
 def create_task(task: TaskCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
@@ -45,20 +228,106 @@ def create_task(task: TaskCreate, db: Session = Depends(get_db), current_user =
     )
     logger.debug(db_task.to_string())
     db.add(db_task)
+    db.flush()
+    # Ids can be reused once the newest task is deleted; the new task must not sync as deleted
+    db.query(TaskTombstone).filter(TaskTombstone.task_id == db_task.id).delete()
     db.commit()
     db.refresh(db_task)
-    return TaskResponse(
-        id=db_task.id,
-        title=db_task.title,
-        completed=db_task.completed,
-        link_url=db_task.link_url,
-        notes=db_task.notes,
-        task_notes=db_task.task_notes,
-        assigned_user_id=db_task.assigned_user_id,
-        assigned_user=db_task.assigned_user,
-        last_updated_at=db_task.last_updated_at.isoformat() if db_task.last_updated_at else "",
-        last_updated_by=db_task.last_updated_by
-    )
+    response = to_task_response(db_task)
+    task_event_broker.publish("created", response.model_dump())
+    return response
+
+# Bulk routes are declared before /tasks/{task_id}, which would otherwise match "bulk"
+@task_router.post("/tasks/bulk", response_model=List[TaskBulkResult], dependencies=[Depends(require_admin)])
+def create_tasks_bulk(tasks: List[TaskCreate], db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+    """
+    Create many tasks with one multi-row INSERT in a single transaction.
+    Results are in request order.
+    """
+    check_bulk_size(tasks)
+    if not tasks:
+        return []
+    now = datetime.utcnow()
+    rows = [
+        {
+            "title": task.title,
+            "completed": False,
+            "link_url": task.link_url,
+            "notes": task.notes,
+            "task_notes": task.task_notes,
+            "assigned_user_id": task.assigned_user_id,
+            "last_updated_at": now,
+            "last_updated_by": current_user.username,
+        }
+        for task in tasks
+    ]
+    ids = list(db.execute(insert(Task).returning(Task.id, sort_by_parameter_order=True), rows).scalars())
+    # Ids can be reused once the newest task is deleted; the new tasks must not sync as deleted
+    db.execute(delete(TaskTombstone).where(TaskTombstone.task_id.in_(ids)))
+    db.commit()
+
+    responses = load_task_responses(db, ids)
+    for task_id in ids:
+        task_event_broker.publish("created", responses[task_id].model_dump())
+    return [TaskBulkResult(index=index, id=task_id, status="created", task=responses[task_id])
+            for index, task_id in enumerate(ids)]
+
+@task_router.put("/tasks/bulk", response_model=List[TaskBulkResult])
+def update_tasks_bulk(tasks: List[TaskBulkUpdate], db: Session = Depends(get_db), current_user = Depends(get_current_user)):
+    """
+    Update many tasks by id with one executemany UPDATE in a single transaction.
+    Unknown ids are reported as not_found; the rest are still applied. When an
+    id appears more than once the last item wins.
+    """
+    check_bulk_size(tasks)
+    requested = {task.id for task in tasks}
+    found = set(db.execute(select(Task.id).where(Task.id.in_(requested))).scalars()) if tasks else set()
+    now = datetime.utcnow()
+    rows = {
+        task.id: {
+            "id": task.id,
+            "title": task.title,
+            "completed": task.completed,
+            "link_url": task.link_url,
+            "notes": task.notes,
+            "task_notes": task.task_notes,
+            "assigned_user_id": task.assigned_user_id,
+            "last_updated_at": now,
+            "last_updated_by": current_user.username,
+        }
+        for task in tasks if task.id in found
+    }
+    if rows:
+        db.execute(update(Task), list(rows.values()))
+    db.commit()
+
+    responses = load_task_responses(db, list(rows))
+    for task_id in rows:
+        task_event_broker.publish("updated", responses[task_id].model_dump())
+    return [
+        TaskBulkResult(index=index, id=task.id, status="updated", task=responses[task.id])
+        if task.id in found else TaskBulkResult(index=index, id=task.id, status="not_found")
+        for index, task in enumerate(tasks)
+    ]
+
+@task_router.post("/tasks/bulk-delete", response_model=List[TaskBulkResult])
+def delete_tasks_bulk(req: TaskBulkDelete, db: Session = Depends(get_db)):
+    """
+    Delete many tasks with one DELETE ... RETURNING in a single transaction,
+    leaving a tombstone for each. Unknown ids are reported as not_found.
+    """
+    check_bulk_size(req.ids)
+    deleted = set()
+    if req.ids:
+        deleted = set(db.execute(delete(Task).where(Task.id.in_(set(req.ids))).returning(Task.id)).scalars())
+    if deleted:
+        record_tombstones(db, list(deleted))
+    db.commit()
+
+    for task_id in deleted:
+        task_event_broker.publish("deleted", {"id": task_id})
+    return [TaskBulkResult(index=index, id=task_id, status="deleted" if task_id in deleted else "not_found")
+            for index, task_id in enumerate(req.ids)]
 
 @task_router.put("/tasks/{task_id}", response_model=TaskResponse)
 def update_task(task_id: int, task: TaskUpdate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
@@ -74,18 +343,9 @@ def update_task(task_id: int, task: TaskUpdate, db: Session = Depends(get_db), c
     db_task.last_updated_by = current_user.username if hasattr(current_user, 'username') else current_user.get("username")
     db.commit()
     db.refresh(db_task)
-    return TaskResponse(
-        id=db_task.id,
-        title=db_task.title,
-        completed=db_task.completed,
-        link_url=db_task.link_url,
-        notes=db_task.notes,
-        task_notes=db_task.task_notes,
-        assigned_user_id=db_task.assigned_user_id,
-        assigned_user=db_task.assigned_user,
-        last_updated_at=db_task.last_updated_at.isoformat() if db_task.last_updated_at else None,
-        last_updated_by=db_task.last_updated_by
-    )
+    response = to_task_response(db_task)
+    task_event_broker.publish("updated", response.model_dump())
+    return response
 
 @task_router.delete("/tasks/{task_id}")
 def delete_task(task_id: int, db: Session = Depends(get_db)):
@@ -93,5 +353,7 @@ def delete_task(task_id: int, db: Session = Depends(get_db)):
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
     db.delete(db_task)
+    record_tombstones(db, [task_id])
     db.commit()
+    task_event_broker.publish("deleted", {"id": task_id})
     return {"message": "Task deleted"}
\ No newline at end of file
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List, Optional
 
 class DuplicateImage(BaseModel):
     image_id: int
@@ -8,3 +9,7 @@ class DuplicateImage(BaseModel):
 
     class Config:
         from_attributes = True
+
+class DuplicateDetectRequest(BaseModel):
+    image_ids: Optional[List[int]] = None  # None rebuilds every group
+    threshold: Optional[int] = None
@@ -20,3 +20,11 @@ class ImageDataset(BaseModel):
     scan_started_at: datetime
     scan_finished_at: datetime
     images: List[ImageDatasetItem]
+
+class ImageMove(BaseModel):
+    old_path: str
+    new_path: str
+
+class ImagePruneRequest(BaseModel):
+    deleted: List[str] = []  # paths no longer on disk
+    moved: List[ImageMove] = []  # renamed or moved files, matched by police without rescanning
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class TaskBase(BaseModel):
     title: str
@@ -68,3 +68,27 @@ class TaskResponse(TaskBase):
     class Config:
         from_attributes = True
 
+
+
+class TaskChanges(BaseModel):
+    tasks: List[TaskResponse]  # created or updated since the cursor
+    deleted: List[int]  # ids of tasks deleted since the cursor
+    cursor: str  # pass back as since on the next sync
+    reset: bool = False  # cursor too old: tasks is the full list, drop anything not in it
+
+
+class TaskBulkUpdate(TaskUpdate):
+    id: int
+
+class TaskBulkDelete(BaseModel):
+    ids: List[int]
+
+class TaskBulkResult(BaseModel):
+    index: int  # position in the request list
+    id: Optional[int] = None
+    status: str  # created, updated, deleted or not_found
+    task: Optional[TaskResponse] = None
+
+class TaskSearchResults(BaseModel):
+    tasks: List[TaskResponse]  # best match first
+    next_offset: Optional[int] = None  # offset of the next page, None on the last page
@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, Tuple
+
+def hash_to_int(hash_val: str) -> int:
+    """
+    Convert a hex pHash string (as reported by scan_image) to a 64-bit integer.
+    """
+    return int(hash_val, 16)
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """
+    Burkhard-Keller tree over integer hashes under Hamming distance.
+    Each node holds one hash value, every item reported with that value, and
+    its children keyed by their distance to the node. A radius-k search only
+    descends into children whose edge distance d satisfies |d - dist| <= k,
+    so a lookup touches a small fraction of the tree for small k.
+    """
+
+    def __init__(self):
+        self.root = None  # [value, items, children]
+        self.size = 0
+
+    def add(self, value: int, item: Any):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[Any, int]]:
+        """
+        Return (item, distance) for every item within max_distance of value.
+        """
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node[0])
+            if distance <= max_distance:
+                matches.extend((item, distance) for item in node[1])
+            children: Dict[int, list] = node[2]
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return matches
@@ -0,0 +1,236 @@
+"""Server-side near-duplicate detection for cleanse images.
+
+Candidates for an image are found through the ``image_hash_bands`` table
+(multi-index hashing): its 64-bit pHash is split into HASH_BANDS bit ranges,
+and any image within fewer than HASH_BANDS bits of it must match at least one
+range exactly. A full rebuild instead indexes every hash in a BK-tree.
+"""
+
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.cleanse.image_model import Image
+from app.models.cleanse.image_hash_band_model import ImageHashBand
+from app.models.cleanse.image_duplicate_group_model import ImageDuplicateGroup
+from app.services.bktree import BKTree, hash_to_int, hamming
+
+import logging
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+HASH_BANDS = int(os.getenv("DUPLICATE_HASH_BANDS", 8))
+# Max number of differing pHash bits for two images to count as duplicates
+DUPLICATE_HASH_THRESHOLD = int(os.getenv("DUPLICATE_HASH_THRESHOLD", 5))
+# Keep IN (...) lists under SQLite's bound-parameter limit
+QUERY_CHUNK_SIZE = 500
+
+
+def chunked(items: List, size: int = QUERY_CHUNK_SIZE) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def hash_bands(hash_int: int) -> List[tuple]:
+    """Split a hash into (band, value) pairs covering all HASH_BITS bits."""
+    bands = []
+    for band in range(HASH_BANDS):
+        start = band * HASH_BITS // HASH_BANDS
+        end = (band + 1) * HASH_BITS // HASH_BANDS
+        bands.append((band, (hash_int >> start) & ((1 << (end - start)) - 1)))
+    return bands
+
+
+def index_image_hashes(db: Session, hashes: Dict[int, Optional[str]]) -> None:
+    """(Re)write the band rows for a mapping of image id to hex hash; caller commits."""
+    for chunk in chunked(list(hashes)):
+        db.query(ImageHashBand).filter(ImageHashBand.image_id.in_(chunk)).delete(synchronize_session=False)
+    db.bulk_insert_mappings(ImageHashBand, [
+        {"image_id": image_id, "band": band, "value": value}
+        for image_id, hash_val in hashes.items() if hash_val
+        for band, value in hash_bands(hash_to_int(hash_val))
+    ])
+
+
+def load_images(db: Session, ids: Iterable[int]) -> Dict[int, Image]:
+    images = {}
+    for chunk in chunked(list(ids)):
+        for img in db.query(Image).filter(Image.id.in_(chunk)).all():
+            images[img.id] = img
+    return images
+
+
+def load_hashes(db: Session, ids: Iterable[int]) -> Dict[int, str]:
+    """Hex hash of every given image that has one."""
+    hashes = {}
+    for chunk in chunked(list(ids)):
+        hashes.update(db.query(Image.id, Image.hash).filter(Image.id.in_(chunk), Image.hash.isnot(None)).all())
+    return hashes
+
+
+def find_root(parents: Dict[int, int], image_id: int) -> int:
+    parents.setdefault(image_id, image_id)
+    while parents[image_id] != image_id:
+        parents[image_id] = parents[parents[image_id]]
+        image_id = parents[image_id]
+    return image_id
+
+
+def union(parents: Dict[int, int], a: int, b: int) -> None:
+    root_a, root_b = find_root(parents, a), find_root(parents, b)
+    if root_a != root_b:
+        parents[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def band_candidates(db: Session, hashes: Iterable[int]) -> Dict[tuple, List[Tuple[int, str]]]:
+    """(id, hex hash) of every indexed image sharing a band with any of hashes, keyed by (band, value)."""
+    values: Dict[int, Set[int]] = {}
+    for hash_int in hashes:
+        for band, value in hash_bands(hash_int):
+            values.setdefault(band, set()).add(value)
+    matches: Dict[tuple, List[Tuple[int, str]]] = {}
+    # band = ? AND value IN (...) is a range lookup on ix_image_hash_bands_band_value
+    for band, band_values in values.items():
+        for chunk in chunked(sorted(band_values)):
+            rows = (db.query(ImageHashBand.value, Image.id, Image.hash)
+                    .join(Image, Image.id == ImageHashBand.image_id)
+                    .filter(ImageHashBand.band == band, ImageHashBand.value.in_(chunk)))
+            for value, image_id, hash_val in rows:
+                matches.setdefault((band, value), []).append((image_id, hash_val))
+    return matches
+
+
+def group_members(db: Session, group_ids: Iterable[int]) -> Dict[int, List[int]]:
+    members: Dict[int, List[int]] = {}
+    for chunk in chunked(list(group_ids)):
+        for group_id, image_id in (db.query(ImageDuplicateGroup.group_id, ImageDuplicateGroup.image_id)
+                                   .filter(ImageDuplicateGroup.group_id.in_(chunk))):
+            members.setdefault(group_id, []).append(image_id)
+    return members
+
+
+def groups_of(db: Session, image_ids: Iterable[int]) -> Set[int]:
+    group_ids = set()
+    for chunk in chunked(list(image_ids)):
+        group_ids.update(row[0] for row in db.query(ImageDuplicateGroup.group_id)
+                         .filter(ImageDuplicateGroup.image_id.in_(chunk)).distinct())
+    return group_ids
+
+
+def write_groups(db: Session, parents: Dict[int, int], images: Dict[int, Image]) -> int:
+    """Replace the group rows of every image in parents with one group per component."""
+    components: Dict[int, List[Image]] = {}
+    for image_id in list(parents):
+        root = find_root(parents, image_id)
+        if image_id in images:  # group rows can outlive a deleted image
+            components.setdefault(root, []).append(images[image_id])
+
+    for chunk in chunked(list(parents)):
+        db.query(ImageDuplicateGroup).filter(ImageDuplicateGroup.image_id.in_(chunk)).delete(synchronize_session=False)
+
+    rows = []
+    group_count = 0
+    for members in components.values():
+        if len(members) < 2:
+            continue
+        group_count += 1
+        # Sharpest image wins, ties go to the oldest
+        members.sort(key=lambda img: (img.blur_score or 0, -img.id), reverse=True)
+        primary = members[0]
+        primary_hash = hash_to_int(primary.hash)
+        for img in members:
+            rows.append({
+                "group_id": primary.id,
+                "image_id": img.id,
+                "is_primary": 1 if img.id == primary.id else 0,
+                "hash_distance": hamming(hash_to_int(img.hash), primary_hash),
+            })
+    db.bulk_insert_mappings(ImageDuplicateGroup, rows)
+    return group_count
+
+
+def detect_duplicates(db: Session, image_ids: Optional[List[int]] = None,
+                      threshold: int = DUPLICATE_HASH_THRESHOLD) -> dict:
+    """Group the given images with their near-duplicates anywhere in the library.
+
+    The given images leave their current groups first (their hash may have
+    changed), and what remains of those groups is regrouped by distance.
+    Existing groups of the images they now match are merged and rewritten so
+    each image belongs to a single group. Without image_ids every group is
+    rebuilt. Everything is written in one transaction.
+    """
+    started = time.perf_counter()
+    if image_ids is None:
+        result = rebuild_duplicates(db, threshold)
+    else:
+        if threshold >= HASH_BANDS:
+            raise ValueError(f"threshold must be below DUPLICATE_HASH_BANDS ({HASH_BANDS})")
+
+        target_hashes = load_hashes(db, image_ids)
+        index_image_hashes(db, target_hashes)
+        targets = {image_id: hash_to_int(hash_val) for image_id, hash_val in target_hashes.items()}
+
+        # 1. Take the targets out of their groups; what is left of them is regrouped in step 3
+        parents: Dict[int, int] = {}
+        left_groups = groups_of(db, targets)
+        for chunk in chunked(list(targets)):
+            db.query(ImageDuplicateGroup).filter(ImageDuplicateGroup.image_id.in_(chunk)).delete(synchronize_session=False)
+        db.flush()
+
+        # 2. Candidate lookup through the band index, confirmed by exact distance
+        matches = band_candidates(db, targets.values())
+        for target_id, target_hash in targets.items():
+            find_root(parents, target_id)
+            for pair in hash_bands(target_hash):
+                for other_id, other_hash in matches.get(pair, ()):
+                    if other_id != target_id and hamming(target_hash, hash_to_int(other_hash)) <= threshold:
+                        union(parents, target_id, other_id)
+
+        # 3. Merge the groups matched images belong to. Groups a target left may have been
+        #    held together through it, so their members are regrouped by pairwise distance
+        matched_groups = groups_of(db, [image_id for image_id in parents if image_id not in targets])
+        for group_id, ids in group_members(db, matched_groups | left_groups).items():
+            if group_id not in left_groups:
+                for image_id in ids[1:]:
+                    union(parents, ids[0], image_id)
+                continue
+            for image_id in ids:
+                find_root(parents, image_id)
+            members = [(image_id, hash_to_int(hash_val)) for image_id, hash_val in load_hashes(db, ids).items()]
+            for i, (image_id, hash_int) in enumerate(members):
+                for other_id, other_hash in members[i + 1:]:
+                    if hamming(hash_int, other_hash) <= threshold:
+                        union(parents, image_id, other_id)
+
+        images = load_images(db, parents)
+        groups = write_groups(db, parents, images)
+        result = {"groups": groups, "images": len(targets)}
+
+    db.commit()
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Duplicate detection finished: %s", result)
+    return result
+
+
+def rebuild_duplicates(db: Session, threshold: int = DUPLICATE_HASH_THRESHOLD) -> dict:
+    """Reindex every hash and recompute all duplicate groups from scratch; caller commits."""
+    images = {img.id: img for img in db.query(Image).filter(Image.hash.isnot(None)).all()}
+
+    db.query(ImageHashBand).delete(synchronize_session=False)
+    index_image_hashes(db, {img.id: img.hash for img in images.values()})
+
+    tree = BKTree()
+    for img in images.values():
+        tree.add(hash_to_int(img.hash), img.id)
+
+    parents: Dict[int, int] = {}
+    for img in images.values():
+        for other_id, _ in tree.search(hash_to_int(img.hash), threshold):
+            if other_id != img.id:
+                union(parents, img.id, other_id)
+
+    db.query(ImageDuplicateGroup).delete(synchronize_session=False)
+    groups = write_groups(db, parents, images)
+    return {"groups": groups, "images": len(images)}
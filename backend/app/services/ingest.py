@@ -0,0 +1,182 @@
+"""Bulk ingestion of police reports into the cleanse tables.
+
+Rows are written in batches of INGEST_BATCH_SIZE, instead of one SELECT and
+commit per image. On SQLite and PostgreSQL a batch is a single
+``INSERT ... ON CONFLICT DO UPDATE ... RETURNING``; on other databases
+existing rows are resolved with one ``IN (...)`` query per batch and then
+updated / inserted with bulk mappings. Callers commit once, so a whole report
+is a single transaction.
+"""
+
+import json
+import os
+import time
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models.cleanse.image_model import Image, BLUR_THRESHOLD
+from app.models.cleanse.image_analysis_model import ImageAnalysis
+from app.services.duplicates import chunked, index_image_hashes
+
+import logging
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.getenv("CLEANSE_INGEST_BATCH_SIZE", 500))
+# Dialects with INSERT ... ON CONFLICT ... RETURNING
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def upsert_rows(db: Session, model, key: str, rows: List[dict]) -> Dict:
+    """Insert or update rows of model matched on the unique column `key`.
+
+    Returns a mapping of key value to primary key for every row.
+    """
+    pk = model.__mapper__.primary_key[0].name
+    key_col = getattr(model, key)
+    # Last row wins when a batch repeats a key
+    rows = list({row[key]: row for row in rows}.values())
+
+    insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        return upsert_on_conflict(db, insert, model, key, pk, rows)
+
+    existing = {}
+    for chunk in chunked([row[key] for row in rows]):
+        existing.update(db.query(key_col, getattr(model, pk)).filter(key_col.in_(chunk)).all())
+
+    updates = [{**row, pk: existing[row[key]]} for row in rows if row[key] in existing]
+    inserts = [row for row in rows if row[key] not in existing]
+    if updates:
+        db.bulk_update_mappings(model, updates)
+    if inserts:
+        db.bulk_insert_mappings(model, inserts, return_defaults=True)
+    return {row[key]: row[pk] for row in updates + inserts}
+
+
+def upsert_on_conflict(db: Session, insert, model, key: str, pk: str, rows: List[dict]) -> Dict:
+    """upsert_rows as one INSERT ... ON CONFLICT (key) DO UPDATE ... RETURNING per chunk."""
+    ids = {}
+    # One statement per column set, since optional fields are only sent by some reporters
+    by_columns: Dict[tuple, List[dict]] = {}
+    for row in rows:
+        by_columns.setdefault(tuple(sorted(row)), []).append(row)
+    for columns, group in by_columns.items():
+        stmt = insert(model)
+        # DO UPDATE even with nothing to change, as DO NOTHING would return no id for existing rows
+        updates = {col: stmt.excluded[col] for col in columns if col not in (key, pk)} or {key: stmt.excluded[key]}
+        stmt = stmt.on_conflict_do_update(index_elements=[key], set_=updates)
+        stmt = stmt.returning(getattr(model, key), getattr(model, pk))
+        for chunk in chunked(group):
+            ids.update(db.execute(stmt.values(chunk)).all())
+    return ids
+
+
+def insert_missing(db: Session, model, rows: List[dict]) -> None:
+    """Insert rows, skipping any whose primary key already exists; caller commits."""
+    insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        pk_columns = [col.name for col in model.__mapper__.primary_key]
+        for row in rows:
+            if db.get(model, tuple(row[col] for col in pk_columns)) is None:
+                db.add(model(**row))
+        return
+    for chunk in chunked(rows):
+        db.execute(insert(model).values(chunk).on_conflict_do_nothing())
+
+
+def ingest_images(db: Session, images: List[dict], analysis: bool = False,
+                  folder_id: Optional[int] = None) -> dict:
+    """Upsert reported images (and optionally their image_analysis rows) in batches.
+
+    Each image dict carries path, hash, blur_score, has_face and optionally
+    checksum, width, height and file_size. Returns the image ids in report order plus
+    timing for every batch; the caller commits.
+    """
+    now = datetime.utcnow()
+    ids = []
+    batches = []
+    for number, batch in enumerate(chunked(images, INGEST_BATCH_SIZE)):
+        started = time.perf_counter()
+        rows = []
+        for img in batch:
+            row = {
+                "path": img["path"],
+                "hash": img["hash"],
+                "blur_score": img["blur_score"],
+                "has_face": img["has_face"],
+            }
+            for field in ("checksum", "width", "height", "file_size"):
+                if img.get(field) is not None:
+                    row[field] = img[field]
+            if folder_id is not None:
+                row["folder_id"] = folder_id
+                row["modified_at"] = now
+            rows.append(row)
+
+        path_ids = upsert_rows(db, Image, "path", rows)
+        index_image_hashes(db, {path_ids[img["path"]]: img["hash"] for img in batch})
+
+        if analysis:
+            upsert_rows(db, ImageAnalysis, "image_id", [
+                {
+                    "image_id": path_ids[img["path"]],
+                    "phash": img["hash"],
+                    "has_face": 1 if img["has_face"] else 0,
+                    "is_blurry": 1 if img["blur_score"] < BLUR_THRESHOLD else 0,
+                    "blur_score": img["blur_score"],
+                    "analyzed_at": now,
+                }
+                for img in batch
+            ])
+
+        ids.extend(path_ids[img["path"]] for img in batch)
+        batches.append({
+            "batch": number,
+            "count": len(batch),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    logger.info("Ingested %d images in %d batches", len(images), len(batches))
+    return {"ids": ids, "batches": batches}
+
+
+async def iter_ndjson_chunks(stream: AsyncIterator[bytes], gzipped: bool = False,
+                             size: int = INGEST_BATCH_SIZE) -> AsyncIterator[List[dict]]:
+    """Parse a newline-delimited JSON body as it arrives, yielding lists of `size` records.
+
+    Raises ValueError on a line that is not valid JSON.
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16) if gzipped else None
+    buffer = b""
+    records = []
+    line_number = 0
+
+    def parse(lines: List[bytes]):
+        nonlocal line_number
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+
+    async for data in stream:
+        if decompressor:
+            data = decompressor.decompress(data)
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        parse(lines)
+        while len(records) >= size:
+            yield records[:size]
+            records = records[size:]
+
+    if decompressor:
+        buffer += decompressor.flush()
+    parse([buffer])
+    if records:
+        yield records
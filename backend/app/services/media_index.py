@@ -0,0 +1,93 @@
+"""Cached directory listings for the media browser.
+
+A folder is listed once with ``os.scandir`` and its entries (type, size,
+mtime) are kept in an LRU cache. Every lookup costs a single stat of the
+folder itself: adding, removing or renaming a file bumps the folder's mtime
+and triggers a rescan. Entries are also rescanned after MEDIA_INDEX_TTL
+seconds so in-place edits to a file's size or date are picked up eventually.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+MEDIA_INDEX_CACHE_SIZE = int(os.getenv("MEDIA_INDEX_CACHE_SIZE", 256))  # folders
+MEDIA_INDEX_TTL = float(os.getenv("MEDIA_INDEX_TTL", 300))
+
+SORT_KEYS = {
+    "name": lambda item: item["name"],
+    "date": lambda item: (item["modified_at"], item["name"]),
+    "size": lambda item: (item["size"] or 0, item["name"]),
+}
+
+
+class DirectoryIndex:
+    def __init__(self, image_exts: set, video_exts: set, max_folders: int = MEDIA_INDEX_CACHE_SIZE):
+        self.image_exts = image_exts
+        self.video_exts = video_exts
+        self.max_folders = max_folders
+        self.lock = threading.Lock()
+        # path -> (folder mtime_ns, scanned_at, {(sort, descending): entries})
+        self.cache: "OrderedDict[str, Tuple[int, float, Dict]]" = OrderedDict()
+
+    def _scan(self, folder: Path) -> List[dict]:
+        items = []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        kind = "folder"
+                    else:
+                        suffix = os.path.splitext(entry.name)[1].lower()
+                        if suffix in self.image_exts:
+                            kind = "image"
+                        elif suffix in self.video_exts:
+                            kind = "video"
+                        else:
+                            continue
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # removed while listing
+                items.append({
+                    "name": entry.name,
+                    "type": kind,
+                    "size": stat.st_size if kind != "folder" else None,
+                    "modified_at": stat.st_mtime,
+                })
+        return items
+
+    def list(self, folder: Path, sort: str = "name", descending: bool = False) -> List[dict]:
+        """All entries of folder in the requested order, from cache when the folder is unchanged."""
+        key = str(folder)
+        mtime_ns = os.stat(folder).st_mtime_ns
+        now = time.time()
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached and cached[0] == mtime_ns and now - cached[1] < MEDIA_INDEX_TTL:
+                self.cache.move_to_end(key)
+                orders = cached[2]
+            else:
+                orders = None
+
+        if orders is None:
+            started = time.perf_counter()
+            orders = {("name", False): sorted(self._scan(folder), key=SORT_KEYS["name"])}
+            logger.info("Indexed %s: %d entries in %.1fms", folder, len(orders[("name", False)]),
+                        (time.perf_counter() - started) * 1000)
+            with self.lock:
+                self.cache[key] = (mtime_ns, now, orders)
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.max_folders:
+                    self.cache.popitem(last=False)
+
+        order = (sort, descending)
+        if order not in orders:
+            # Sorted views are built once per folder version and shared between requests
+            orders[order] = sorted(orders[("name", False)], key=SORT_KEYS[sort], reverse=descending)
+        return orders[order]
@@ -0,0 +1,100 @@
+"""Removal and relocation of cleanse images that changed on disk.
+
+Deleted images take their ``image_analysis``, ``image_hash_bands`` and
+``image_duplicate_groups`` rows with them. The rows are deleted explicitly
+rather than through ``ON DELETE CASCADE``, which SQLite only honours with
+``PRAGMA foreign_keys`` on. Duplicate groups that lose a member are rewritten
+from their survivors, so a group left with one image disappears and a group
+that lost its primary gets a new one.
+"""
+
+import time
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from app.models.cleanse.image_model import Image
+from app.models.cleanse.image_analysis_model import ImageAnalysis
+from app.models.cleanse.image_hash_band_model import ImageHashBand
+from app.models.cleanse.image_duplicate_group_model import ImageDuplicateGroup
+from app.services.duplicates import chunked, find_root, load_images, union, write_groups
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def ids_for_paths(db: Session, paths: List[str]) -> Dict[str, int]:
+    ids = {}
+    for chunk in chunked(list(set(paths))):
+        ids.update(db.query(Image.path, Image.id).filter(Image.path.in_(chunk)).all())
+    return ids
+
+
+def delete_images(db: Session, image_ids: List[int]) -> int:
+    """Delete images with their dependent rows and regroup the duplicates they leave behind; caller commits."""
+    if not image_ids:
+        return 0
+    deleted = set(image_ids)
+
+    # Members of the groups the deleted images belonged to
+    groups: Dict[int, List[int]] = {}
+    for chunk in chunked(image_ids):
+        group_ids = [row[0] for row in db.query(ImageDuplicateGroup.group_id)
+                     .filter(ImageDuplicateGroup.image_id.in_(chunk)).distinct()]
+        for group_chunk in chunked(group_ids):
+            for group_id, image_id in (db.query(ImageDuplicateGroup.group_id, ImageDuplicateGroup.image_id)
+                                       .filter(ImageDuplicateGroup.group_id.in_(group_chunk))):
+                groups.setdefault(group_id, []).append(image_id)
+
+    for chunk in chunked(image_ids):
+        for model in (ImageDuplicateGroup, ImageHashBand, ImageAnalysis):
+            db.query(model).filter(model.image_id.in_(chunk)).delete(synchronize_session=False)
+        db.query(Image).filter(Image.id.in_(chunk)).delete(synchronize_session=False)
+
+    parents: Dict[int, int] = {}
+    for members in groups.values():
+        survivors = [image_id for image_id in members if image_id not in deleted]
+        for image_id in survivors:
+            find_root(parents, image_id)
+            union(parents, survivors[0], image_id)
+    if parents:
+        write_groups(db, parents, load_images(db, parents))
+    return len(deleted)
+
+
+def prune_images(db: Session, deleted: List[str], moved: List[dict]) -> dict:
+    """Apply deletions and moves reported by police in one transaction.
+
+    A move rewrites the image's path, keeping its id and therefore its
+    analysis and duplicate groups. When the new path is already known (it was
+    reported before the move was noticed), the old row is deleted instead.
+    """
+    started = time.perf_counter()
+    old_ids = ids_for_paths(db, [move["old_path"] for move in moved])
+    new_ids = ids_for_paths(db, [move["new_path"] for move in moved])
+
+    updates = []
+    superseded = []
+    for move in moved:
+        image_id = old_ids.get(move["old_path"])
+        if image_id is None:
+            continue
+        if move["new_path"] in new_ids:
+            superseded.append(image_id)
+        else:
+            updates.append({"id": image_id, "path": move["new_path"]})
+            new_ids[move["new_path"]] = image_id
+    if updates:
+        db.bulk_update_mappings(Image, updates)
+
+    delete_ids = list(ids_for_paths(db, deleted).values()) + superseded
+    removed = delete_images(db, delete_ids)
+    db.commit()
+
+    result = {
+        "deleted": removed,
+        "moved": len(updates),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    logger.info("Pruned images: %s", result)
+    return result
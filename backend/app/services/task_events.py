@@ -0,0 +1,76 @@
+"""In-process pub/sub for task change events, streamed as server-sent events.
+
+create_task, update_task and delete_task publish once their transaction has
+committed; every /task/events connection subscribes with its own bounded
+asyncio queue. Publishers run in the threadpool, so events are handed to the
+subscriber's event loop with ``call_soon_threadsafe``. A subscriber that falls
+TASK_EVENTS_BUFFER events behind has its backlog replaced by a single
+``resync`` event: the client catches up through /task/changes instead of the
+server buffering without bound for it.
+
+Events only reach clients connected to the same process.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from typing import Dict
+
+import logging
+logger = logging.getLogger(__name__)
+
+TASK_EVENTS_BUFFER = int(os.getenv("TASK_EVENTS_BUFFER", 100))  # events per subscriber
+
+
+class TaskEventBroker:
+    def __init__(self, buffer_size: int = TASK_EVENTS_BUFFER):
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.last_id = 0
+        # queue -> event loop the subscriber reads it from
+        self.subscribers: Dict[asyncio.Queue, asyncio.AbstractEventLoop] = {}
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber; must be called from the loop that will read the queue."""
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        with self.lock:
+            self.subscribers[queue] = asyncio.get_running_loop()
+            count = len(self.subscribers)
+        logger.info(f"Task events: subscriber added ({count} connected)")
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self.lock:
+            self.subscribers.pop(queue, None)
+            count = len(self.subscribers)
+        logger.info(f"Task events: subscriber removed ({count} connected)")
+
+    def publish(self, event_type: str, data: dict):
+        """Queue an event for every subscriber; safe to call from any thread."""
+        with self.lock:
+            self.last_id += 1
+            event = {"id": self.last_id, "type": event_type, "data": data}
+            targets = list(self.subscribers.items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                self.unsubscribe(queue)  # its loop has shut down
+
+    @staticmethod
+    def _deliver(queue: asyncio.Queue, event: dict):
+        if queue.full():
+            # Slow client: drop its backlog and tell it to resync from /task/changes
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({"id": event["id"], "type": "resync", "data": {}})
+            return
+        queue.put_nowait(event)
+
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+task_event_broker = TaskEventBroker()
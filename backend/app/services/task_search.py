@@ -0,0 +1,118 @@
+"""Full-text search over task title, notes and task_notes.
+
+SQLite uses an external-content FTS5 table, ``tasks_fts``, that triggers on
+``tasks`` keep in sync, so every write path (single, bulk or manual SQL) is
+covered. PostgreSQL uses a GIN index on a weighted ``tsvector`` expression,
+which the database maintains itself. ensure_search_index() creates whichever
+applies and is run by init_db.
+
+Queries are split into words and every word is prefix-matched, all words
+required; results are ranked with title matches weighing most, then notes,
+then task_notes. Accents are folded on SQLite only (PostgreSQL's unaccent is
+an extension and cannot be used in an index expression).
+"""
+
+import re
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Databases with a search index; callers check this before searching
+SEARCH_DIALECTS = ("sqlite", "postgresql")
+
+SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, notes, task_notes,
+        content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, title, notes, task_notes)
+        VALUES (new.id, new.title, new.notes, new.task_notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, notes, task_notes)
+        VALUES ('delete', old.id, old.title, old.notes, old.task_notes);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, notes, task_notes ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, title, notes, task_notes)
+        VALUES ('delete', old.id, old.title, old.notes, old.task_notes);
+        INSERT INTO tasks_fts(rowid, title, notes, task_notes)
+        VALUES (new.id, new.title, new.notes, new.task_notes);
+    END
+    """,
+]
+# bm25() column weights: title, notes, task_notes
+SQLITE_SEARCH = """
+    SELECT rowid FROM tasks_fts
+    WHERE tasks_fts MATCH :query
+    ORDER BY bm25(tasks_fts, 10.0, 2.0, 1.0), rowid
+    LIMIT :limit OFFSET :offset
+"""
+
+PG_SEARCH_VECTOR = (
+    "(setweight(to_tsvector('simple', coalesce(title, '')), 'A')"
+    " || setweight(to_tsvector('simple', coalesce(notes, '')), 'B')"
+    " || setweight(to_tsvector('simple', coalesce(task_notes, '')), 'C'))"
+)
+PG_SEARCH_INDEX_DDL = f"CREATE INDEX IF NOT EXISTS ix_tasks_search ON tasks USING gin ({PG_SEARCH_VECTOR})"
+PG_SEARCH = f"""
+    SELECT id FROM tasks
+    WHERE {PG_SEARCH_VECTOR} @@ to_tsquery('simple', :query)
+    ORDER BY ts_rank({PG_SEARCH_VECTOR}, to_tsquery('simple', :query)) DESC, id
+    LIMIT :limit OFFSET :offset
+"""
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """Create the search index for the engine's database if missing (no-op on other databases)."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "sqlite":
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'")).first()
+            for ddl in SQLITE_FTS_DDL:
+                conn.execute(text(ddl))
+            if not exists:
+                # Index the tasks written before the triggers existed
+                conn.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+                logger.info("Created tasks_fts and indexed existing tasks")
+        elif dialect == "postgresql":
+            conn.execute(text(PG_SEARCH_INDEX_DDL))
+        else:
+            logger.warning(f"Task search is not supported on {dialect}")
+
+
+def query_words(query: str) -> List[str]:
+    # Words only: quotes, operators and punctuation never reach the match syntax
+    return re.findall(r"[^\W_]+", query.lower())
+
+
+async def search_task_ids(db: AsyncSession, query: str, limit: int, offset: int = 0) -> List[int]:
+    """Ids of tasks matching every word of query as a prefix, best match first.
+
+    The session's dialect must be one of SEARCH_DIALECTS.
+    """
+    words = query_words(query)
+    if not words:
+        return []
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        sql, match = SQLITE_SEARCH, " ".join(f'"{word}"*' for word in words)
+    elif dialect == "postgresql":
+        sql, match = PG_SEARCH, " & ".join(f"{word}:*" for word in words)
+    else:
+        raise ValueError(f"Task search is not supported on {dialect}")
+    result = await db.execute(text(sql), {"query": match, "limit": limit, "offset": offset})
+    return list(result.scalars())
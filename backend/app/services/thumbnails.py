@@ -0,0 +1,248 @@
+"""Thumbnail rendering on a bounded process pool.
+
+Thumbnails are rendered in worker processes so a gallery of fresh photos
+never ties up the API's threadpool with full-size decodes. JPEGs are
+decoded with draft mode (DCT scaling), which is several times cheaper than
+decoding at full resolution. Concurrent requests for the same thumbnail
+share one render. A pool whose worker died (e.g. killed for memory on a
+huge PNG) is replaced on the next render instead of failing every request.
+
+Cache keys hash the source path with its mtime and size, so an edited photo
+gets a fresh thumbnail, and files are sharded two levels deep by key. The
+mtime of a cached thumbnail doubles as its last-used time for a size-capped
+LRU sweep, so HTTP validators for thumbnails come from the key and the
+source's mtime instead.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+import logging
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_VARIANTS = {
+    "grid": (300, 300),
+    "preview": (1280, 1280),
+}
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()  # webp or jpeg
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", 80))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+THUMBNAIL_SWEEP_EVERY = int(os.getenv("THUMBNAIL_SWEEP_EVERY", 500))  # renders between sweeps
+THUMBNAIL_TOUCH_SECONDS = 3600  # refresh a hit's last-used time at most this often
+THUMBNAIL_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+THUMBNAIL_MEDIA_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def render_thumbnail(file_path: str, thumb_path: str, size: Tuple[int, int],
+                     fmt: str = THUMBNAIL_FORMAT, quality: int = THUMBNAIL_QUALITY) -> str:
+    """Render one thumbnail; runs in a worker process."""
+    with Image.open(file_path) as img:
+        # Only JPEGs honour draft; it decodes straight at the nearest 1/2, 1/4 or 1/8 scale
+        img.draft("RGB", size)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(size)
+        if fmt == "jpeg" and img.mode != "RGB":
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+        Path(thumb_path).parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a half-written thumbnail
+        tmp_path = f"{thumb_path}.{os.getpid()}.tmp"
+        img.save(tmp_path, format=fmt.upper(), quality=quality)
+    os.replace(tmp_path, thumb_path)
+    return thumb_path
+
+
+class ThumbnailService:
+    """Renders and caches thumbnails for files under media_root."""
+
+    def __init__(self, media_root: Path, thumbnail_dir: Path, workers: int = THUMBNAIL_WORKERS):
+        self.media_root = media_root
+        self.thumbnail_dir = thumbnail_dir
+        self.workers = workers
+        self.fmt = THUMBNAIL_FORMAT if THUMBNAIL_FORMAT in THUMBNAIL_EXTENSIONS else "webp"
+        self.media_type = THUMBNAIL_MEDIA_TYPES[self.fmt]
+        self.executor = None
+        self.lock = threading.Lock()
+        self.pending: Dict[str, Future] = {}
+        self.sweeping = False
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "renders": 0,
+            "failures": 0,
+            "evictions": 0,
+            "evicted_bytes": 0,
+            "cache_bytes": None,  # as of the last sweep
+            "last_sweep_at": None,
+        }
+
+    def _executor(self) -> ProcessPoolExecutor:
+        # Created lazily, with spawn so workers don't inherit the server's threads
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def _submit(self, *args) -> Future:
+        # Called with self.lock held
+        try:
+            return self._executor().submit(render_thumbnail, *args)
+        except BrokenProcessPool:
+            logger.warning("Thumbnail pool lost a worker; restarting it")
+            broken, self.executor = self.executor, None
+            broken.shutdown(wait=False)
+            # Renders still pending on the dead pool fail with it; don't hand them to new callers
+            self.pending.clear()
+            return self._executor().submit(render_thumbnail, *args)
+
+    def thumb_path(self, file_path: Path, variant: str, stat: os.stat_result) -> Path:
+        relative = file_path.relative_to(self.media_root).as_posix()
+        key = hashlib.sha1(
+            f"{relative}|{stat.st_mtime_ns}|{stat.st_size}|{variant}|{self.fmt}".encode()
+        ).hexdigest()
+        return self.thumbnail_dir / key[:2] / key[2:4] / f"{key}{THUMBNAIL_EXTENSIONS[self.fmt]}"
+
+    def _count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def get(self, file_path: Path, variant: str = "grid", stat: Optional[os.stat_result] = None) -> Future:
+        """Future resolving to the thumbnail path, rendering it if it is not cached.
+
+        Callers asking for a thumbnail that is already rendering get the same future.
+        stat is file_path's stat, when the caller already has it.
+        """
+        if variant not in THUMBNAIL_VARIANTS:
+            raise ValueError(f"Unknown thumbnail size '{variant}'")
+        thumb_path = self.thumb_path(file_path, variant, stat or file_path.stat())
+        try:
+            thumb_stat = thumb_path.stat()
+        except FileNotFoundError:
+            thumb_stat = None
+        if thumb_stat is not None:
+            self._count("hits")
+            if time.time() - thumb_stat.st_mtime > THUMBNAIL_TOUCH_SECONDS:
+                os.utime(thumb_path)
+            done = Future()
+            done.set_result(str(thumb_path))
+            return done
+
+        key = str(thumb_path)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future
+            self.stats["misses"] += 1
+            future = self._submit(str(file_path), key, THUMBNAIL_VARIANTS[variant], self.fmt)
+            self.pending[key] = future
+        # Outside the lock: the callback runs inline if the render has already finished
+        future.add_done_callback(lambda f: self._done(key, f))
+        return future
+
+    def _done(self, key: str, future: Future):
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+            if future.exception() is not None:
+                self.stats["failures"] += 1
+                return
+            self.stats["renders"] += 1
+            sweep_due = self.stats["renders"] % THUMBNAIL_SWEEP_EVERY == 0
+        if sweep_due:
+            self.sweep_in_background()
+
+    def sweep_in_background(self) -> bool:
+        """Start an eviction sweep unless one is already running."""
+        with self.lock:
+            if self.sweeping:
+                return False
+            self.sweeping = True
+        threading.Thread(target=self.sweep, name="thumbnail-sweep", daemon=True).start()
+        return True
+
+    def sweep(self, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES) -> dict:
+        """Evict least recently used thumbnails until the cache is back under 90% of max_bytes."""
+        try:
+            files = []
+            total = 0
+            stack = [self.thumbnail_dir]
+            while stack:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            stat = entry.stat()
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                            total += stat.st_size
+
+            evicted = evicted_bytes = 0
+            if total > max_bytes:
+                target = max_bytes * 0.9
+                files.sort()
+                for _, size, path in files:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    evicted += 1
+                    evicted_bytes += size
+
+            with self.lock:
+                self.stats["evictions"] += evicted
+                self.stats["evicted_bytes"] += evicted_bytes
+                self.stats["cache_bytes"] = total
+                self.stats["last_sweep_at"] = time.time()
+            logger.info("Thumbnail sweep: %d files evicted, cache now %d bytes", evicted, total)
+            return {"evicted": evicted, "evicted_bytes": evicted_bytes, "cache_bytes": total}
+        finally:
+            with self.lock:
+                self.sweeping = False
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {**self.stats, "pending": len(self.pending), "max_bytes": THUMBNAIL_CACHE_MAX_BYTES}
+
+    def prefetch(self, folder: Path, image_exts: set, variants: List[str]) -> None:
+        """Render missing thumbnails for every image in folder on a background thread."""
+        threading.Thread(
+            target=self._prefetch, args=(folder, image_exts, variants),
+            name="thumbnail-prefetch", daemon=True
+        ).start()
+
+    def _prefetch(self, folder: Path, image_exts: set, variants: List[str]):
+        # Keep only a few renders queued so interactive requests are not stuck behind a whole folder
+        slots = threading.BoundedSemaphore(self.workers * 2)
+        count = 0
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or Path(entry.name).suffix.lower() not in image_exts:
+                    continue
+                for variant in variants:
+                    slots.acquire()
+                    try:
+                        future = self.get(Path(entry.path), variant)
+                    except Exception as e:  # e.g. deleted since the scan, or the pool failing again
+                        slots.release()
+                        logger.warning("Prefetch skipped %s: %s", entry.path, e)
+                        break
+                    future.add_done_callback(lambda _: slots.release())
+                    count += 1
+        logger.info("Queued %d thumbnails for %s", count, folder)
@@ -0,0 +1,99 @@
+"""In-process caches behind get_current_user.
+
+Every authenticated request decodes its bearer token and loads the user, and
+HLS playback alone fetches a segment every couple of seconds per viewer. Both
+steps are served from memory here:
+
+- decoded tokens are kept until the token's own ``exp`` (a payload never
+  changes, so there is nothing to invalidate)
+- users are kept for AUTH_USER_CACHE_TTL seconds; role changes and
+  registrations made through this process drop the entry at once, the TTL
+  bounds how long another worker can serve a stale role
+
+Both caches are bounded LRUs. AUTH_USER_CACHE_TTL=0 turns the user cache off.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.models.user_model import User
+from app.security.auth import decode_access_token
+
+import logging
+logger = logging.getLogger(__name__)
+
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", 30))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", 1024))  # users
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 1024))  # tokens
+
+
+class ExpiringLRU:
+    """Thread-safe LRU mapping whose entries each carry an absolute expiry time."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # key -> (expires_at, value)
+        self.entries: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value, expires_at: float):
+        if expires_at <= time.time():
+            return
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = ExpiringLRU(AUTH_TOKEN_CACHE_SIZE)
+user_cache = ExpiringLRU(AUTH_USER_CACHE_SIZE)
+
+
+def decode_token(token: str) -> dict:
+    """decode_access_token, remembered until the token expires; invalid tokens raise as before."""
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = decode_access_token(token)
+        if payload and "exp" in payload:
+            token_cache.put(token, payload, float(payload["exp"]))
+    return payload
+
+
+def get_user(username: str) -> Optional[User]:
+    """The cached (detached) User for username, if still fresh."""
+    return user_cache.get(username)
+
+
+def cache_user(user: User):
+    """Remember a detached User; callers must not add it to a session (merge it instead)."""
+    if AUTH_USER_CACHE_TTL > 0:
+        user_cache.put(user.username, user, time.time() + AUTH_USER_CACHE_TTL)
+
+
+def invalidate_user(username: str):
+    """Drop username from the user cache after its row changed."""
+    user_cache.invalidate(username)
+    logger.debug(f"User cache invalidated for {username}")
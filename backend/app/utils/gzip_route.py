@@ -0,0 +1,37 @@
+"""Route class that accepts gzip-compressed request bodies.
+
+Routers built with ``route_class=GzipRoute`` transparently decompress bodies
+sent with ``Content-Encoding: gzip`` before FastAPI parses them, so clients
+can compress large JSON uploads. Handlers reading ``request.stream()``
+themselves still receive the raw bytes.
+"""
+
+import zlib
+from typing import Callable
+
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+
+
+class GzipRequest(Request):
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if self.headers.get("content-encoding", "").lower() == "gzip":
+                try:
+                    body = zlib.decompress(body, zlib.MAX_WBITS | 16)
+                except zlib.error as e:
+                    raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+            self._body = body
+        return self._body
+
+
+class GzipRoute(APIRoute):
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def custom_route_handler(request: Request) -> Response:
+            request = GzipRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return custom_route_handler
@@ -14,14 +14,20 @@ from app.db.database import Base, engine
 # (this is safe even if imported multiple times)
 import app.models.user_model  # noqa: F401
 import app.models.task_model  # noqa: F401
+from app.services.task_search import ensure_search_index
 
 logger = logging.getLogger(__name__)
 
+# Partial indexes whose name encodes their predicate; a database index with one of these
+# prefixes that the model no longer declares was built for an old predicate and is dropped
+REPLACED_INDEX_PREFIXES = ("ix_images_blurred_",)
+
 
 def create_tables() -> None:
     """Create all tables defined on SQLAlchemy Base (no-op if they already exist)."""
     logger.info("Creating database tables (if not present)...")
     Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
     logger.info("Database tables created / verified.")
 
 def autoupgrade() -> None:
@@ -31,6 +37,9 @@ def autoupgrade() -> None:
     - Create missing tables (delegates to create_all)
     - Add missing columns to existing tables using ALTER TABLE ADD COLUMN
       (only adds column as NULLABLE if the model requires NOT NULL and no default value)
+    - Create missing indexes on existing tables (e.g. for newly added indexed columns)
+    - Drop partial indexes superseded by one with a new predicate (REPLACED_INDEX_PREFIXES)
+    - Create the task full-text search index (FTS5 table and triggers on SQLite)
 
     Note: This is intended for simple schema changes (adding columns). More complex
     migrations (renames, type changes, column drops) should use Alembic migrations.
@@ -108,6 +117,41 @@ def autoupgrade() -> None:
             except Exception:
                 logger.exception("Failed to add column %s.%s", name, col.name)
 
+    # 3) For existing tables, create indexes declared on the model but missing in the database
+    for table in Base.metadata.sorted_tables:
+        name = table.name
+        if name not in existing_tables:
+            continue
+
+        existing_indexes = {ix['name'] for ix in inspector.get_indexes(name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            logger.info("Creating index %s on table %s", index.name, name)
+            try:
+                index.create(bind=engine)
+                logger.info("Successfully created index %s", index.name)
+            except Exception:
+                logger.exception("Failed to create index %s", index.name)
+
+        declared = {index.name for index in table.indexes}
+        for index_name in existing_indexes - declared:
+            if not index_name.startswith(REPLACED_INDEX_PREFIXES):
+                continue
+            logger.info("Dropping superseded index %s on table %s", index_name, name)
+            try:
+                from sqlalchemy import text
+                with engine.begin() as conn:
+                    conn.execute(text(f'DROP INDEX "{index_name}"'))
+            except Exception:
+                logger.exception("Failed to drop index %s", index_name)
+
+    # 4) Full-text search index, which is not part of the SQLAlchemy metadata
+    try:
+        ensure_search_index(engine)
+    except Exception:
+        logger.exception("Failed to create the task search index")
+
     logger.info("Autoupgrade complete. For complex migrations use Alembic.")
 
 
@@ -22,6 +22,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"] ,
     allow_headers=["*"] ,
+    expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count"],
 )
 
 app.include_router(auth_router)
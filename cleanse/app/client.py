@@ -0,0 +1,90 @@
+# client.py
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import logging
+logger = logging.getLogger(__name__)
+
+CLEANSE_API_URL = os.getenv('CLEANSE_API_URL', 'http://localhost:8000')
+HTTP_CONNECT_TIMEOUT = float(os.getenv('CLEANSE_HTTP_CONNECT_TIMEOUT', 5))
+# Full duplicate rebuilds on a large library can take minutes
+HTTP_READ_TIMEOUT = float(os.getenv('CLEANSE_HTTP_READ_TIMEOUT', 300))
+HTTP_RETRIES = int(os.getenv('CLEANSE_HTTP_RETRIES', 3))
+HTTP_BACKOFF = float(os.getenv('CLEANSE_HTTP_BACKOFF', 0.5))  # seconds, doubled per retry
+HTTP_GZIP = os.getenv('CLEANSE_HTTP_GZIP', '1') == '1'
+HTTP_GZIP_MIN_BYTES = 1024  # smaller bodies are sent as is
+HTTP_POOL_SIZE = 4
+RETRY_STATUSES = {502, 503, 504}
+
+class ApiClient:
+    """
+    Shared HTTP client for the cleanse API.
+    - one pooled keep-alive Session for every request
+    - (connect, read) timeouts on every call
+    - up to HTTP_RETRIES retries with exponential backoff and jitter on
+      connection errors, timeouts and 502/503/504; every cleanse endpoint is an
+      idempotent upsert, so replaying a request is safe
+    - JSON bodies gzip-compressed when HTTP_GZIP is on
+    """
+
+    def __init__(self, base_url: str = CLEANSE_API_URL):
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post_json(self, path: str, payload) -> requests.Response:
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json"}
+        if HTTP_GZIP and len(body) >= HTTP_GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        return self.request('POST', path, data=lambda: body, headers=headers)
+
+    def post_stream(self, path: str, body: Callable[[], Iterable[bytes]], headers: dict) -> requests.Response:
+        """
+        POST a streamed body; body is a factory so a retry can start the stream over.
+        """
+        return self.request('POST', path, data=body, headers=headers)
+
+    def request(self, method: str, path: str, data: Optional[Callable] = None,
+                headers: Optional[dict] = None) -> requests.Response:
+        url = self.base_url + path
+        for attempt in range(HTTP_RETRIES + 1):
+            try:
+                response = self.session.request(
+                    method, url, data=data() if data else None, headers=headers,
+                    timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+                )
+                if response.status_code not in RETRY_STATUSES or attempt == HTTP_RETRIES:
+                    return response
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == HTTP_RETRIES:
+                    raise
+                reason = str(e)
+            delay = HTTP_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.info(f"Client: {method} {path} failed ({reason}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> ApiClient:
+    """
+    The process-wide client, created on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApiClient()
+        return _client
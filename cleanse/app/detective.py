@@ -1,55 +1,23 @@
 # detective.py
-import requests
 from typing import List
-import os
+from app.client import get_client
 
 import logging
 logger = logging.getLogger(__name__)
 
-CLEANSE_API_URL = os.getenv('CLEANSE_API_URL', 'http://localhost:8000')
-FETCH_API_URL = CLEANSE_API_URL + '/cleanse/images/metadata'
-DUPLICATES_API_URL = CLEANSE_API_URL + '/cleanse/images/duplicates'
+DETECT_API_PATH = '/cleanse/images/duplicates/detect'
 
-def detective_run(new_image_paths: List[str] = None):
+def detective_run(new_image_ids: List[int] = None):
     """
-    Detect duplicates using FastAPI data.
-    - new_image_paths: optional, only check these images; else check all
+    Ask FastAPI to detect duplicates.
+    - new_image_ids: optional, only look for duplicates of these images; else rebuild all groups
+    Matching happens in the backend against the whole library, so nothing is downloaded here.
     """
-    # 1. Fetch images from FastAPI    
-    params = {"paths": ",".join(new_image_paths)} if new_image_paths else {}
-    logger.info(f"Fetching image via fastapi using {params}")
-    resp = requests.get(FETCH_API_URL, params=params)
-    resp.raise_for_status()
-    images = resp.json()["images"]  # [{id, path, hash, blur_score, has_face}, ...]
-
-    # 2. Group images by hash
-    logger.info(f"Grouping images using hash")
-    hash_groups = {}
-    for img in images:
-        hash_groups.setdefault(img["hash"], []).append(img)
-
-    # 3. Prepare duplicate groups
-    logger.info(f"Preparing duplicates")
-    duplicate_groups = []
-    for hash_val, group_images in hash_groups.items():
-        if len(group_images) < 2:
-            continue  # no duplicates
-
-        # Sort by blur_score descending, then by smallest image_id
-        group_images.sort(key=lambda x: (x["blur_score"], -x["id"]), reverse=True)
-        master_image_id = group_images[0]["id"]
-
-        for img in group_images:
-            duplicate_groups.append({
-                "group_id": hash_val,  # can use hash as group_id
-                "image_id": img["id"],
-                "is_primary": master_image_id
-            })
-
-    # 4. Send results to FastAPI
-    logger.info(f"Sending results to fastapi")
-    resp = requests.post(DUPLICATES_API_URL, json = duplicate_groups)
+    payload = {"image_ids": new_image_ids} if new_image_ids else {}
+    logger.info(f"Detective: Requesting duplicate detection for {len(new_image_ids) if new_image_ids else 'all'} images")
+    resp = get_client().post_json(DETECT_API_PATH, payload)
     if resp.status_code == 200:
-        logger.info(f"Detective: {len(duplicate_groups)} duplicates reported to FastAPI.")
+        result = resp.json()
+        logger.info(f"Detective: {result['groups']} duplicate groups updated in {result['elapsed_ms']}ms.")
     else:
-        logger.info("Detective: Failed to report duplicates.")
+        logger.info("Detective: Failed to detect duplicates.")
@@ -0,0 +1,236 @@
+# engine.py
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.scan import scan_image
+
+import logging
+logger = logging.getLogger(__name__)
+
+SCAN_WORKERS = int(os.getenv('CLEANSE_SCAN_WORKERS', os.cpu_count() or 1))
+SCAN_QUEUE_SIZE = int(os.getenv('CLEANSE_SCAN_QUEUE_SIZE', 256))
+REPORT_BATCH_SIZE = int(os.getenv('CLEANSE_REPORT_BATCH_SIZE', 200))
+REPORT_FLUSH_SECONDS = float(os.getenv('CLEANSE_REPORT_FLUSH_SECONDS', 2.0))
+
+_DONE = object()
+
+def _scan_job(file_path: str, rel_path: str, known: Optional[List[dict]] = None) -> dict:
+    """
+    Runs in a worker process; must stay a module-level function so it can be pickled.
+    """
+    image_data = scan_image(file_path, known)
+    image_data["path"] = rel_path
+    return image_data
+
+class ScanEngine:
+    """
+    Fans scan_image out over a process pool and streams results to a reporter.
+    - submit() blocks once SCAN_QUEUE_SIZE images are scanning or waiting to be
+      reported, so memory stays flat however large the library is
+    - a reporter thread hands results to `report` in batches of REPORT_BATCH_SIZE
+      (or whatever arrived within REPORT_FLUSH_SECONDS) while scanning continues
+    - images submitted with the same key (e.g. a quick content signature) while
+      the first is still scanning wait for it and are scanned with its result as
+      `known`, so byte-identical copies within one patrol are decoded once; the
+      result is kept until its batch has been reported
+    - when a worker dies (e.g. killed for memory on a huge PNG) the pool is
+      rebuilt and the scans it took down are retried one at a time on their own
+      worker; an image that kills that worker too is skipped and passed to
+      `on_crash`, so it can be left alone until it changes
+    `report` receives a list of (image_data, context) tuples, where context is
+    whatever the caller passed to submit() for that image; `on_crash` receives
+    (rel_path, context).
+    """
+
+    def __init__(self,
+                 report: Callable[[List[Tuple[dict, Any]]], None],
+                 on_crash: Optional[Callable[[str, Any], None]] = None,
+                 workers: int = SCAN_WORKERS,
+                 queue_size: int = SCAN_QUEUE_SIZE,
+                 batch_size: int = REPORT_BATCH_SIZE):
+        self.report = report
+        self.on_crash = on_crash
+        self.workers = workers
+        self.batch_size = batch_size
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.results = queue.Queue(maxsize=queue_size + 1)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.reporter = threading.Thread(target=self._report_loop, name="cleanse-reporter", daemon=True)
+        self.reporter.start()
+        self.submitted = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        self.outstanding = 0  # submitted but not yet handed to the reporter
+        # key -> None while its first image is scanning, then that image's features until reported
+        self.by_key: Dict[str, Optional[dict]] = {}
+        self.waiting: Dict[str, List[tuple]] = {}
+        # Scans lost to a dead worker, rerun one at a time so a crash convicts only its own image
+        self.suspects = deque()
+        self.isolating = False
+        self.isolation_executor: Optional[ProcessPoolExecutor] = None
+        self.crashed = 0
+        logger.info(f"Scan engine started with {workers} workers")
+
+    def submit(self, file_path: str, rel_path: str, context: Any = None,
+               known: Optional[List[dict]] = None, key: Optional[str] = None):
+        """
+        Queue an image for scanning; known is passed through to scan_image.
+        Without known, an earlier image submitted with the same key supplies it.
+        """
+        self.slots.acquire()
+        with self.lock:
+            self.submitted += 1
+            self.outstanding += 1
+            if key is not None and not known:
+                if key not in self.by_key:
+                    self.by_key[key] = None
+                elif self.by_key[key] is None:
+                    self.waiting.setdefault(key, []).append((file_path, rel_path, context))
+                    return
+                else:
+                    known, key = [self.by_key[key]], None
+            else:
+                key = None
+        self._start(file_path, rel_path, context, known, key)
+
+    def _start(self, file_path: str, rel_path: str, context: Any, known: Optional[List[dict]], key: Optional[str],
+               isolated: bool = False):
+        job = (file_path, rel_path, context, known, key)
+        with self.lock:
+            if isolated:
+                if self.isolation_executor is None:
+                    self.isolation_executor = ProcessPoolExecutor(max_workers=1)
+                executor = self.isolation_executor
+            else:
+                executor = self.executor
+        try:
+            future = executor.submit(_scan_job, file_path, rel_path, known)
+        except Exception as e:
+            # e.g. BrokenProcessPool: fail it like a scan, so its slot, key and waiters are released
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda f: self._on_done(f, executor, job, isolated))
+
+    def _on_done(self, future, executor: ProcessPoolExecutor, job: tuple, isolated: bool):
+        file_path, rel_path, context, _, key = job
+        try:
+            image_data = future.result()
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            if not isolated:
+                # Any scan in flight on the dead worker's pool may be the culprit
+                logger.warning(f"Scan engine: Worker died while scanning {file_path}; retrying it on its own")
+                self._isolate(job)
+                return
+            image_data = None
+            self.failed += 1
+            self.crashed += 1
+            logger.warning(f"Scan engine: {file_path} crashed its worker; skipping it")
+            if self.on_crash is not None:
+                try:
+                    self.on_crash(rel_path, context)
+                except Exception:
+                    logger.exception(f"Scan engine: Failed to record crash of {file_path}")
+        except Exception as e:
+            image_data = None
+            self.failed += 1
+            logger.info(f"Scan engine: Failed to scan {file_path} - {e}")
+
+        if key is not None:
+            with self.lock:
+                waiters = self.waiting.pop(key, [])
+                if image_data is None:
+                    del self.by_key[key]
+                    known = None
+                else:
+                    self.by_key[key] = {name: value for name, value in image_data.items()
+                                        if name not in ("path", "timings")}
+                    known = [self.by_key[key]]
+            for waiter in waiters:
+                self._start(*waiter, known, None)
+
+        if image_data is None:
+            self.slots.release()
+        else:
+            self.results.put((image_data, context, key))
+        with self.lock:
+            self.outstanding -= 1
+            self.idle.notify_all()
+        if isolated:
+            self._next_suspect()
+
+    def _replace_executor(self, broken: ProcessPoolExecutor):
+        with self.lock:
+            if broken is self.executor:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                logger.warning("Scan engine: A worker died; restarted the process pool")
+            elif broken is self.isolation_executor:
+                self.isolation_executor = None
+            else:
+                return  # already replaced by another scan that was on it
+        broken.shutdown(wait=False)
+
+    def _isolate(self, job: tuple):
+        with self.lock:
+            self.suspects.append(job)
+            if self.isolating:
+                return
+            self.isolating = True
+        self._next_suspect()
+
+    def _next_suspect(self):
+        with self.lock:
+            if not self.suspects:
+                self.isolating = False
+                return
+            job = self.suspects.popleft()
+        self._start(*job, isolated=True)
+
+    def _report_loop(self):
+        batch = []
+        while True:
+            try:
+                item = self.results.get(timeout=REPORT_FLUSH_SECONDS)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                batch.append(item)
+                self.slots.release()
+            if batch and (item is None or len(batch) >= self.batch_size):
+                self._report(batch)
+                batch = []
+        if batch:
+            self._report(batch)
+
+    def _report(self, batch: List[Tuple[dict, Any, Optional[str]]]):
+        try:
+            self.report([(image_data, context) for image_data, context, _ in batch])
+        except Exception:
+            logger.exception(f"Scan engine: Failed to report {len(batch)} images")
+        # Reported copies are found through the manifest from now on
+        with self.lock:
+            for _, _, key in batch:
+                if key is not None:
+                    self.by_key.pop(key, None)
+
+    def close(self):
+        """
+        Wait for every submitted image to be scanned and reported.
+        """
+        with self.lock:
+            # Copies waiting on another image are only started once it finishes
+            self.idle.wait_for(lambda: self.outstanding == 0)
+        self.executor.shutdown(wait=True)
+        if self.isolation_executor is not None:
+            self.isolation_executor.shutdown(wait=True)
+        self.results.put(_DONE)
+        self.reporter.join()
+        logger.info(f"Scan engine finished: {self.submitted} submitted, {self.failed} failed "
+                    f"({self.crashed} crashed a worker)")
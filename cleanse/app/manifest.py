@@ -0,0 +1,244 @@
+# manifest.py
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+from app.scan import SCAN_FEATURES_VERSION
+
+import logging
+logger = logging.getLogger(__name__)
+
+MANIFEST_PATH = os.getenv('CLEANSE_MANIFEST_PATH', 'manifest.db')
+SEEN_FLUSH_SIZE = 1000
+
+class Manifest:
+    """
+    Local record of every image police has scanned, keyed by path relative to
+    MEDIA_FOLDER. An entry holds the (mtime, size, inode) the file had when it
+    was scanned plus the features that were reported, so a file whose stat
+    signature is unchanged never has to be decoded again, as long as its
+    features were computed by the current SCAN_FEATURES_VERSION. Images that crashed
+    a scan worker are kept apart, with the stat they crashed at, so they are not
+    retried (and the worker killed again) until the file changes.
+    Safe to share between the patrol walk and the scan engine's reporter thread.
+    """
+
+    def __init__(self, db_path: str = MANIFEST_PATH):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                hash TEXT,
+                blur_score REAL,
+                has_face INTEGER,
+                scanned_at REAL,
+                checksum TEXT,
+                signature TEXT,
+                features_version TEXT
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(images)")}
+        for column in ("checksum", "signature", "features_version"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE images ADD COLUMN {column} TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_images_inode ON images (inode)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_images_signature ON images (signature)")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS crashes (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                crashed_at REAL
+            )
+        """)
+        self.conn.commit()
+        self._seen = []
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def lookup(self, path: str) -> Optional[dict]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT mtime_ns, size, inode, hash, blur_score, has_face, features_version FROM images WHERE path = ?",
+                (path,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "mtime_ns": row[0],
+            "size": row[1],
+            "inode": row[2],
+            "hash": row[3],
+            "blur_score": row[4],
+            "has_face": bool(row[5]),
+            "features_version": row[6],
+        }
+
+    def is_unchanged(self, path: str, stat: os.stat_result) -> bool:
+        """
+        True when the file at path still has the signature it was scanned (or crashed) with,
+        and its features are of the current version.
+        """
+        entry = self.lookup(path)
+        if entry is not None and entry["features_version"] != SCAN_FEATURES_VERSION:
+            return False
+        if entry is None:
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT mtime_ns, size, inode FROM crashes WHERE path = ?", (path,)
+                ).fetchone()
+            if row is None:
+                return False
+            entry = {"mtime_ns": row[0], "size": row[1], "inode": row[2]}
+        return (
+            entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+            and entry["inode"] == stat.st_ino
+        )
+
+    def find_by_signature(self, signature: str, limit: int = 4) -> List[dict]:
+        """
+        Features and checksums of recorded files with the given quick signature,
+        i.e. candidates for being byte-identical to the file it was computed from.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT checksum, hash, blur_score, has_face FROM images "
+                "WHERE signature = ? AND checksum IS NOT NULL AND features_version = ? LIMIT ?",
+                (signature, SCAN_FEATURES_VERSION, limit)
+            ).fetchall()
+        return [
+            {"checksum": row[0], "hash": row[1], "blur_score": row[2], "has_face": bool(row[3])}
+            for row in rows
+        ]
+
+    def record(self, images: List[dict], stats: List[os.stat_result], signatures: List[str]):
+        """
+        Store the reported features of images along with the stat and quick signature they were scanned at.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                """
+                INSERT INTO images (path, mtime_ns, size, inode, hash, blur_score, has_face, scanned_at,
+                                    checksum, signature, features_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    mtime_ns = excluded.mtime_ns,
+                    size = excluded.size,
+                    inode = excluded.inode,
+                    hash = excluded.hash,
+                    blur_score = excluded.blur_score,
+                    has_face = excluded.has_face,
+                    scanned_at = excluded.scanned_at,
+                    checksum = excluded.checksum,
+                    signature = excluded.signature,
+                    features_version = excluded.features_version
+                """,
+                [
+                    (img["path"], st.st_mtime_ns, st.st_size, st.st_ino,
+                     img["hash"], img["blur_score"], int(bool(img["has_face"])), now,
+                     img.get("checksum"), signature, SCAN_FEATURES_VERSION)
+                    for img, st, signature in zip(images, stats, signatures)
+                ]
+            )
+            self.conn.commit()
+
+    def record_crash(self, path: str, stat: os.stat_result):
+        """
+        Remember that the file at path, with this stat, crashed the scan worker.
+        """
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO crashes (path, mtime_ns, size, inode, crashed_at) VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_mtime_ns, stat.st_size, stat.st_ino, time.time())
+            )
+            self.conn.commit()
+
+    def find_moved(self, stat: os.stat_result, exists) -> Optional[str]:
+        """
+        Recorded path of the file with stat's (inode, size, mtime) whose own path
+        no longer exists (exists(path) is False), i.e. the path it was moved from.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path FROM images WHERE inode = ? AND size = ? AND mtime_ns = ?",
+                (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            ).fetchall()
+        for (path,) in rows:
+            if not exists(path):
+                return path
+        return None
+
+    def move(self, moves: List[Tuple[str, str]]):
+        """
+        Re-key entries from old to new path, keeping their features.
+        """
+        with self.lock:
+            self.conn.executemany(
+                "DELETE FROM images WHERE path = ?", [(new,) for _, new in moves]
+            )
+            self.conn.executemany(
+                "UPDATE images SET path = ? WHERE path = ?", [(new, old) for old, new in moves]
+            )
+            self.conn.commit()
+
+    def forget(self, paths: List[str]):
+        with self.lock:
+            self.conn.executemany("DELETE FROM images WHERE path = ?", [(p,) for p in paths])
+            self.conn.commit()
+
+    # Mark-and-sweep over a temp table, so finding vanished files does not
+    # need every path of the library held in memory.
+    def begin_patrol(self):
+        with self.lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS seen (path TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM seen")
+            self._seen = []
+
+    def mark_seen(self, path: str):
+        self._seen.append((path,))
+        if len(self._seen) >= SEEN_FLUSH_SIZE:
+            self._flush_seen()
+
+    def _flush_seen(self):
+        if self._seen:
+            with self.lock:
+                self.conn.executemany("INSERT OR IGNORE INTO seen (path) VALUES (?)", self._seen)
+            self._seen = []
+
+    def vanished(self) -> List[str]:
+        """
+        Paths recorded in the manifest that were not seen during this patrol.
+        Crash records of files that are gone are dropped here too.
+        """
+        self._flush_seen()
+        with self.lock:
+            self.conn.execute("DELETE FROM crashes WHERE path NOT IN (SELECT path FROM seen)")
+            self.conn.commit()
+            rows = self.conn.execute(
+                "SELECT path FROM images WHERE path NOT IN (SELECT path FROM seen)"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def paths_under(self, path: str) -> List[str]:
+        """
+        Recorded paths equal to path or inside the folder path.
+        """
+        prefix = path.rstrip('/').replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '/%'
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path FROM images WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (path, prefix)
+            ).fetchall()
+        return [row[0] for row in rows]
@@ -1,14 +1,23 @@
 import os
+import json
+import zlib
 import requests
-from app.scan import scan_image
-from typing import List
+from typing import Any, Dict, Iterable, List, Tuple
+from app.client import get_client
 from app.detective import detective_run
+from app.manifest import Manifest
+from app.engine import ScanEngine
+from app.scan import quick_signature
 import logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
 
-CLEANSE_API_URL = os.getenv('CLEANSE_API_URL', 'http://localhost:8000')
-REPORT_API_URL = CLEANSE_API_URL + '/cleanse/images/report'
+REPORT_API_PATH = '/cleanse/images/report'
+REPORT_STREAM_API_PATH = '/cleanse/images/report/stream'
+PRUNE_API_PATH = '/cleanse/images/prune'
+# 'json' posts each batch as one array; 'ndjson' streams it line by line (gzip unless CLEANSE_REPORT_GZIP=0)
+REPORT_MODE = os.getenv('CLEANSE_REPORT_MODE', 'json')
+REPORT_GZIP = os.getenv('CLEANSE_REPORT_GZIP', '1') == '1'
 
 MEDIA_FOLDER = os.getenv('MEDIA_MOUNT', '../mnt/media/shared/photos')
 MEDIA_FOLDER = '../mnt'
@@ -17,52 +26,268 @@ IGNORE_FILES = os.getenv('CLEANSE_IGNORE_FILES', '.DS_Store,ignore_file')
 def police_patrol():
     """
     Patrol all folders in MEDIA_FOLDER, scan new images, and report features.
+    Images whose (mtime, size, inode) match the manifest are skipped, so a
+    patrol over an unchanged library is a stat-only walk. Changed images are
+    scanned on the scan engine's process pool and reported in batches while
+    the walk continues. Files that vanished or moved (same inode, size and
+    mtime under a new path) are reported to the backend for pruning, except
+    under folders the walk could not list (e.g. a transient EIO on the share).
     """
     
     folders_to_ignore = IGNORE_FOLDERS.split(',')
     files_to_ignore = IGNORE_FILES.split(',')
     logger.info(f"Police patrolling {MEDIA_FOLDER}")
-    for root, _, files in os.walk(MEDIA_FOLDER):
-        new_images = []
-        logger.info(f"Patrol started for {root}")
-        if os.path.isdir(root):
-            if root.split('/')[-1] in folders_to_ignore:
-                logger.info(f"Ignored directory {root}")
-                continue
-        
-        logger.info(f"Checking files {files}")
-        for file in files: 
-            # logger.info(f"Checking file {file}")
-            if os.path.isfile(os.path.join(root, file)):
-                # logger.info(f"{file} is a file")
-                if file.split('/')[-1] in files_to_ignore:
-                    logger.info(f"Ignored file {file}")
+    manifest = Manifest()
+    manifest.begin_patrol()
+    engine = ScanEngine(report=lambda batch: report_images(batch, manifest),
+                        on_crash=lambda rel_path, context: manifest.record_crash(rel_path, context[0]))
+    seen_count = 0
+    moves = {}
+    unreadable = []
+
+    def walk_error(e: OSError):
+        logger.warning(f"Police: Could not list {e.filename} - {e}; nothing under it is pruned this patrol")
+        unreadable.append(os.path.relpath(e.filename, MEDIA_FOLDER))
+
+    try:
+        for root, dirs, files in os.walk(MEDIA_FOLDER, onerror=walk_error):
+            queued = 0
+            logger.info(f"Patrol started for {root}")
+            if os.path.isdir(root):
+                if root.split('/')[-1] in folders_to_ignore:
+                    logger.info(f"Ignored directory {root}")
                     continue
+            # Don't descend into ignored folders (e.g. the sharded .thumbnails cache) at all
+            dirs[:] = [d for d in dirs if d not in folders_to_ignore]
+            
+            logger.info(f"Checking files {files}")
+            for file in files: 
+                # logger.info(f"Checking file {file}")
+                if os.path.isfile(os.path.join(root, file)):
+                    # logger.info(f"{file} is a file")
+                    if file.split('/')[-1] in files_to_ignore:
+                        logger.info(f"Ignored file {file}")
+                        continue
 
-            if file.lower().endswith((".jpg", ".png", ".jpeg")) and not file.startswith("._"):
                 file_path = os.path.join(root, file)
-                # logger.info(f"file path is {file_path}")
-                image_data = scan_image(file_path)  # returns dict with hash, blur_score, has_face
-                image_data["path"] = os.path.relpath(file_path, MEDIA_FOLDER)
-                new_images.append(image_data)
-        
-        logger.info(f"Patrol completed for {root}; identified {len(new_images)}")
-
-        if new_images:
-            logger.info(f"Police: Found {len(new_images)} new images. Reporting to FastAPI with {new_images}")        
-            response = requests.post(REPORT_API_URL, json = new_images)
-            if response.status_code == 200:
-                logger.info("Police: Reported successfully.")
-                # Trigger detective for new images
-                trigger_detective([img["path"] for img in new_images])
-            else:
-                logger.info("Police: Failed to report images.")
-        else:
-            logger.info("Police: No new media found.")
-
-def trigger_detective(new_image_paths: List[str]):
+                if queue_if_changed(file_path, manifest, engine, moves, mark_seen=True):
+                    queued += 1
+                if is_image_file(file):
+                    seen_count += 1
+            
+            logger.info(f"Patrol completed for {root}; queued {queued} for scanning")
+    finally:
+        engine.close()
+
+    # An empty walk usually means the share is not mounted; don't treat that as a mass deletion
+    vanished = [path for path in manifest.vanished()
+                if path not in moves and not is_under(path, unreadable)] if seen_count else []
+    if vanished:
+        logger.info(f"Police: {len(vanished)} images vanished since last patrol")
+    report_pruned(vanished, moves, manifest)
+    manifest.close()
+    return vanished
+
+def police_patrol_paths(paths: Iterable[str]):
+    """
+    Scan and report only the given paths, as queued by the watcher.
+    - Files are scanned if their stat signature changed since the manifest saw them
+    - Folders (created or moved in) are walked in full
+    - Paths that no longer exist drop their manifest entry, and for a folder every entry under it
+    Returns the vanished manifest paths.
+    """
+    folders_to_ignore = IGNORE_FOLDERS.split(',')
+    manifest = Manifest()
+    engine = ScanEngine(report=lambda batch: report_images(batch, manifest),
+                        on_crash=lambda rel_path, context: manifest.record_crash(rel_path, context[0]))
+    paths = sorted(set(paths))
+    moves = {}
+    vanished = []
+    queued = 0
+    # A new folder is reported along with the files written into it; each file is checked once,
+    # as the manifest only learns about a queued file after its report is accepted
+    handled = set()
+    try:
+        for path in paths:
+            rel_path = os.path.relpath(path, MEDIA_FOLDER)
+            if rel_path.startswith('..'):
+                continue
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs[:] = [d for d in dirs if d not in folders_to_ignore]
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        if file_path not in handled:
+                            handled.add(file_path)
+                            queued += queue_if_changed(file_path, manifest, engine, moves)
+            elif os.path.isfile(path):
+                if path not in handled:
+                    handled.add(path)
+                    queued += queue_if_changed(path, manifest, engine, moves)
+            elif is_missing(path):
+                vanished.extend(manifest.paths_under(rel_path))
+    finally:
+        engine.close()
+
+    logger.info(f"Police: {queued} changed images queued from {len(paths)} watched paths")
+    vanished = [path for path in vanished if path not in moves]
+    if vanished:
+        logger.info(f"Police: {len(vanished)} images vanished")
+    report_pruned(vanished, moves, manifest)
+    manifest.close()
+    return vanished
+
+def is_under(path: str, folders: List[str]) -> bool:
+    """
+    True when the relative path is one of folders or inside one ('.' is MEDIA_FOLDER itself).
+    """
+    return any(folder == '.' or path == folder or path.startswith(folder + '/') for folder in folders)
+
+def is_missing(path: str) -> bool:
+    """
+    True only when path is known not to exist; any other stat error leaves it alone.
+    """
+    try:
+        os.lstat(path)
+    except FileNotFoundError:
+        return True
+    except OSError as e:
+        logger.warning(f"Police: Could not stat {path} - {e}")
+    return False
+
+def is_image_file(file: str) -> bool:
+    name = os.path.basename(file)
+    return name.lower().endswith((".jpg", ".png", ".jpeg")) and not name.startswith("._")
+
+def queue_if_changed(file_path: str, manifest: Manifest, engine: ScanEngine,
+                     moves: Dict[str, str], mark_seen: bool = False) -> bool:
+    """
+    Submit file_path to the scan engine unless it is not an image, is ignored,
+    or still matches its manifest entry. Returns True when it was queued.
+    - A new path whose (inode, size, mtime) belongs to a manifest entry that no
+      longer exists is a move: it is added to moves (old -> new) instead of being rescanned
+    """
+    if os.path.basename(file_path) in IGNORE_FILES.split(','):
+        logger.info(f"Ignored file {file_path}")
+        return False
+    if not is_image_file(file_path):
+        return False
+    rel_path = os.path.relpath(file_path, MEDIA_FOLDER)
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        # Still there as far as we know; keep it out of the vanished sweep
+        logger.warning(f"Police: Could not stat {file_path} - {e}")
+        if mark_seen:
+            manifest.mark_seen(rel_path)
+        return False
+    if mark_seen:
+        manifest.mark_seen(rel_path)
+    if manifest.is_unchanged(rel_path, stat):
+        return False
+    if manifest.lookup(rel_path) is None:
+        moved_from = manifest.find_moved(
+            stat, lambda path: path in moves or os.path.lexists(os.path.join(MEDIA_FOLDER, path))
+        )
+        if moved_from is not None:
+            moves[moved_from] = rel_path
+            return False
+    try:
+        signature = quick_signature(file_path, stat.st_size)
+    except OSError:
+        return False
+    # Copies of an already scanned file reuse its features once their checksums match; the
+    # engine does the same for copies met earlier in this patrol that are not recorded yet
+    known = manifest.find_by_signature(signature)
+    engine.submit(file_path, rel_path, (stat, signature), known, key=signature)  # scans checksum, hash, blur_score, has_face
+    return True
+
+def report_images(batch: List[Tuple[dict, Any]], manifest: Manifest):
+    """
+    Report a batch of scanned images to FastAPI; called from the scan engine's reporter thread.
+    Batches fill up across folders, so a library of many small folders still
+    costs one request per REPORT_BATCH_SIZE images.
+    """
+    new_images = [image_data for image_data, _ in batch]
+    stats = [stat for _, (stat, _) in batch]
+    signatures = [signature for _, (_, signature) in batch]
+    log_scan_timings(new_images)
+    logger.info(f"Police: Found {len(new_images)} new images. Reporting to FastAPI")
+    if REPORT_MODE == 'ndjson':
+        headers = {"Content-Type": "application/x-ndjson"}
+        if REPORT_GZIP:
+            headers["Content-Encoding"] = "gzip"
+        response = get_client().post_stream(REPORT_STREAM_API_PATH, lambda: ndjson_body(new_images, REPORT_GZIP), headers)
+    else:
+        response = get_client().post_json(REPORT_API_PATH, new_images)
+    if response.status_code == 200:
+        logger.info("Police: Reported successfully.")
+        # Only remember what the backend has accepted, so failed reports are retried next patrol
+        manifest.record(new_images, stats, signatures)
+        # Trigger detective for new images
+        trigger_detective(response.json()["ids"])
+    else:
+        logger.info("Police: Failed to report images.")
+
+def report_pruned(vanished: List[str], moves: Dict[str, str], manifest: Manifest):
+    """
+    Tell FastAPI which images were deleted or moved, then update the manifest to match.
+    The manifest is left alone when the request fails, so the next patrol reports them again.
+    """
+    if not vanished and not moves:
+        return
+    logger.info(f"Police: Reporting {len(vanished)} deleted and {len(moves)} moved images")
+    payload = {
+        "deleted": vanished,
+        "moved": [{"old_path": old, "new_path": new} for old, new in moves.items()],
+    }
+    try:
+        response = get_client().post_json(PRUNE_API_PATH, payload)
+    except requests.RequestException as e:
+        logger.info(f"Police: Failed to report pruned images: {e}")
+        return
+    if response.status_code == 200:
+        manifest.move(list(moves.items()))
+        manifest.forget(vanished)
+        logger.info(f"Police: Pruned {response.json()['deleted']} images, moved {response.json()['moved']}")
+    else:
+        logger.info("Police: Failed to report pruned images.")
+
+def ndjson_body(images: List[dict], compress: bool):
+    """
+    Yield images as newline-delimited JSON, encoded lazily so the body is never built in memory.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+    for img in images:
+        line = (json.dumps(img) + "\n").encode()
+        if compressor:
+            line = compressor.compress(line)
+        if line:
+            yield line
+    if compressor:
+        yield compressor.flush()
+
+def log_scan_timings(images: List[dict]):
+    """
+    Strip per-image stage timings from the report and log the batch totals.
+    """
+    totals = {}
+    reused = 0
+    for img in images:
+        timings = img.pop("timings", {})
+        if "decode" not in timings:
+            reused += 1  # byte-identical to a scanned file, features were copied
+        for stage, ms in timings.items():
+            totals[stage] = totals.get(stage, 0.0) + ms
+    if totals:
+        summary = ", ".join(f"{stage} {ms:.0f}ms" for stage, ms in totals.items())
+        logger.info(f"Police: Scan timings for {len(images)} images ({reused} exact copies): {summary}")
+
+def trigger_detective(new_image_ids: List[int]):
     """
     Trigger the detective service for duplicate detection.
     """
     logger.info("Police: Triggering Detective...")
-    detective_run(new_image_paths)
+    detective_run(new_image_ids)
@@ -1,35 +1,116 @@
 # scan.py
 import cv2
 import imagehash
+import numpy as np
 from PIL import Image
 # import face_recognition
+import hashlib
 import os
+import time
+from typing import List, Optional
 
-BLUR_THRESHOLD = os.getenv('BLUR_THRESHOLD', 100.0)
+# Laplacian variance below which an image is blurry, on the SCAN_DECODE_SIZE scale (keep in
+# step with the backend's). At 1024px a Gaussian blur of sigma >= 1.5px scores under 50 and
+# sigma <= 0.75px over it; full-resolution scores of large photos are not comparable.
+BLUR_THRESHOLD = float(os.getenv('BLUR_THRESHOLD', 50.0))
+# Longest side the image is decoded at before features are computed; 0 decodes at full resolution.
+# JPEGs use draft (DCT-scaled) decoding, so a 40 MB photo is never fully decompressed.
+SCAN_DECODE_SIZE = int(os.getenv('SCAN_DECODE_SIZE', 1024))
+# Scale the reported features were computed at; manifest entries from another version are rescanned
+SCAN_FEATURES_VERSION = f"2:{SCAN_DECODE_SIZE}"
 
-def scan_image(file_path: str) -> dict:
+# Bytes read from each end of a file for its quick signature
+SIGNATURE_BLOCK_SIZE = 64 * 1024
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+def quick_signature(file_path: str, size: int) -> str:
+    """
+    Cheap prefilter for byte-identical files: size plus a digest of the first
+    and last SIGNATURE_BLOCK_SIZE bytes. Equal files always share it; files
+    that share it still need their full checksum compared.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(SIGNATURE_BLOCK_SIZE))
+        if size > SIGNATURE_BLOCK_SIZE:
+            f.seek(max(SIGNATURE_BLOCK_SIZE, size - SIGNATURE_BLOCK_SIZE))
+            digest.update(f.read(SIGNATURE_BLOCK_SIZE))
+    return digest.hexdigest()
+
+def file_checksum(file_path: str) -> str:
+    """
+    BLAKE2b digest of the whole file, streamed in CHECKSUM_CHUNK_SIZE chunks.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(CHECKSUM_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def decode_grayscale(file_path: str) -> Image.Image:
+    """
+    Decode an image once as grayscale, downscaled to SCAN_DECODE_SIZE.
+    """
+    with Image.open(file_path) as img:
+        if SCAN_DECODE_SIZE:
+            img.draft('L', (SCAN_DECODE_SIZE, SCAN_DECODE_SIZE))
+        gray = img.convert('L')
+    if SCAN_DECODE_SIZE:
+        # draft only scales by powers of two; resize the rest of the way so blur scores are comparable
+        gray.thumbnail((SCAN_DECODE_SIZE, SCAN_DECODE_SIZE))
+    return gray
+
+def phash_feature(gray: Image.Image, pixels: np.ndarray) -> str:
+    return str(imagehash.phash(gray))
+
+def blur_feature(gray: Image.Image, pixels: np.ndarray) -> float:
+    return float(cv2.Laplacian(pixels, cv2.CV_64F).var())
+
+def face_feature(gray: Image.Image, pixels: np.ndarray) -> bool:
+    # faces = face_recognition.face_locations(pixels)
+    # return len(faces) > 0
+    return False
+
+# Every feature is computed from the same decoded buffer
+FEATURES = {
+    "hash": phash_feature,
+    "blur_score": blur_feature,
+    "has_face": face_feature,
+}
+
+def scan_image(file_path: str, known: Optional[List[dict]] = None) -> dict:
     """
     Scan an image and return its features:
+    - checksum: content checksum of the file
     - hash
     - blur_score
     - has_face
+    - timings: milliseconds spent decoding and computing each feature
+    known: features of byte-identical candidates (same quick signature); when one
+    has this file's checksum its features are reused and nothing is decoded.
     """
-    # Hash
-    img = Image.open(file_path)
-    hash_val = str(imagehash.phash(img))
-
-    # Blur detection
-    cv_img = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
-    blur_score = cv2.Laplacian(cv_img, cv2.CV_64F).var()
-
-    # Face detection
-    # faces = face_recognition.load_image_file(file_path)
-    # face_locations = face_recognition.face_locations(faces)
-    # has_face = len(face_locations) > 0
-    has_face = False
-
-    return {
-        "hash": hash_val,
-        "blur_score": blur_score,
-        "has_face": has_face,
-    }
+    timings = {}
+    start = time.perf_counter()
+    checksum = file_checksum(file_path)
+    timings["checksum"] = (time.perf_counter() - start) * 1000
+    for candidate in known or []:
+        if candidate.get("checksum") == checksum:
+            features = {name: candidate[name] for name in FEATURES}
+            features["checksum"] = checksum
+            features["timings"] = timings
+            return features
+
+    start = time.perf_counter()
+    gray = decode_grayscale(file_path)
+    pixels = np.asarray(gray)
+    timings["decode"] = (time.perf_counter() - start) * 1000
+
+    features = {}
+    for name, feature in FEATURES.items():
+        start = time.perf_counter()
+        features[name] = feature(gray, pixels)
+        timings[name] = (time.perf_counter() - start) * 1000
+
+    features["checksum"] = checksum
+    features["timings"] = timings
+    return features
@@ -0,0 +1,149 @@
+# watcher.py
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from typing import Dict, List, Set, Tuple
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Seconds without new events before a burst of changes is handed over
+WATCH_DEBOUNCE = float(os.getenv('CLEANSE_WATCH_DEBOUNCE', 2.0))
+# Longest a change waits while events keep arriving (e.g. a bulk copy)
+WATCH_MAX_DELAY = float(os.getenv('CLEANSE_WATCH_MAX_DELAY', 30.0))
+
+# From <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """
+    Recursive inotify watch over a folder tree, using libc through ctypes.
+    wait_for_changes() blocks until something changes and returns the set of
+    touched paths once the burst has been quiet for WATCH_DEBOUNCE seconds.
+    Raises OSError from start() when inotify is unavailable (non-Linux, or the
+    watch limit in /proc/sys/fs/inotify/max_user_watches is too low), so the
+    caller can fall back to polling.
+    """
+
+    def __init__(self, root: str, ignore_dirs: List[str]):
+        self.root = root
+        self.ignore_dirs = set(ignore_dirs)
+        self.fd = None
+        self.watches: Dict[int, str] = {}
+        self.overflowed = False
+
+    def start(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError(errno.ENOSYS, "libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watch_tree(self.root)
+        logger.info(f"Watcher: Watching {len(self.watches)} folders under {self.root}")
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def watch_tree(self, folder: str):
+        for root, dirs, _ in os.walk(folder):
+            dirs[:] = [d for d in dirs if d not in self.ignore_dirs]
+            self.add_watch(root)
+
+    def add_watch(self, folder: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return  # gone before we got to it
+            raise OSError(err, f"inotify_add_watch failed for {folder}")
+        self.watches[wd] = folder
+
+    def _read_events(self) -> List[Tuple[str, int]]:
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            folder = self.watches.get(wd)
+            if folder is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.watches[wd]
+                continue
+            path = os.path.join(folder, os.fsdecode(name)) if name else folder
+            events.append((path, mask))
+        return events
+
+    def _handle(self, changes: Set[str], events: List[Tuple[str, int]]):
+        for path, mask in events:
+            if mask & IN_ISDIR:
+                if os.path.basename(path) in self.ignore_dirs:
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # New folder (possibly already full, e.g. moved in): watch it and scan all of it
+                    self.watch_tree(path)
+                    changes.add(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    changes.add(path)
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                changes.add(path)
+            elif mask & IN_CREATE:
+                continue  # wait for IN_CLOSE_WRITE so half-copied files are not scanned
+            else:
+                changes.add(path)
+
+    def wait_for_changes(self, timeout: float = None) -> Set[str]:
+        """
+        Block until files change (or timeout), then return the debounced set of changed paths.
+        Check `overflowed` afterwards: when set, events were lost and a full patrol is needed.
+        """
+        changes: Set[str] = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changes
+        first_event = time.monotonic()
+        while True:
+            self._handle(changes, self._read_events())
+            waited = time.monotonic() - first_event
+            if waited >= WATCH_MAX_DELAY:
+                break
+            ready, _, _ = select.select([self.fd], [], [], min(WATCH_DEBOUNCE, WATCH_MAX_DELAY - waited))
+            if not ready:
+                break
+        return changes
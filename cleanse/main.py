@@ -1,13 +1,20 @@
 # main.py
 import os
 import time
-from app.police import police_patrol
+from app.police import police_patrol, police_patrol_paths, MEDIA_FOLDER, IGNORE_FOLDERS
+from app.watcher import InotifyWatcher
 import requests
 import logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger(__name__)
 logging.getLogger("uvicorn").setLevel(logging.INFO)
 
+# 'watch' reacts to inotify events (falling back to 'poll' when inotify is unavailable); 'poll' rewalks on a timer
+CLEANSE_MODE = os.getenv('CLEANSE_MODE', 'watch')
+POLL_INTERVAL = int(os.getenv('CLEANSE_POLL_INTERVAL', 60))
+# Full patrol every so often in watch mode, to catch anything the events missed (e.g. edits made over SMB/NFS)
+RESYNC_INTERVAL = int(os.getenv('CLEANSE_RESYNC_INTERVAL', 6 * 3600))
+
 # CLEANSE_API_URL = os.getenv('CLEANSE_API_URL', 'http://localhost:8000/') + '/cleanse/image-dataset'
 
 # def trigger_cleanser():
@@ -23,13 +30,37 @@ logging.getLogger("uvicorn").setLevel(logging.INFO)
 #     except Exception as e:
 #         logger.info(f"Cleanser: Exception occurred - {e}")
 
-def main(poll_interval=60):
+def main(poll_interval=POLL_INTERVAL):
     """
     Main loop to patrol media folder, detect duplicates, and trigger cleanser.
     """
+    if CLEANSE_MODE == 'watch':
+        watcher = InotifyWatcher(MEDIA_FOLDER, IGNORE_FOLDERS.split(','))
+        try:
+            watcher.start()
+        except OSError as e:
+            logger.warning(f"Main: Watcher unavailable ({e}); falling back to polling")
+            watcher.close()
+        else:
+            return watch(watcher)
+    poll(poll_interval)
+
+def run_patrol(patrol, *args):
+    """
+    Run a patrol, logging its failure instead of letting it stop the service.
+    """
+    try:
+        patrol(*args)
+    except Exception:
+        logger.exception("Main: Police patrol failed; will try again on the next one")
+
+def poll(poll_interval):
+    """
+    Rewalk the whole media folder every poll_interval seconds.
+    """
     while True:
         logger.info("Main: Running police patrol...")
-        police_patrol()
+        run_patrol(police_patrol)
         
         # logger.info("Main: Triggering cleanser...")
         # trigger_cleanser()
@@ -37,5 +68,26 @@ def main(poll_interval=60):
         logger.info(f"Main: Sleeping for {poll_interval} seconds before next patrol...")
         time.sleep(poll_interval)
 
+def watch(watcher: InotifyWatcher):
+    """
+    Patrol once to catch up, then scan only the paths the watcher reports.
+    - Bursts of events (bulk copies) arrive as one debounced batch
+    - A full patrol runs when the event queue overflowed and every RESYNC_INTERVAL seconds
+    """
+    logger.info("Main: Running initial police patrol...")
+    run_patrol(police_patrol)
+    last_patrol = time.monotonic()
+    while True:
+        timeout = max(0, RESYNC_INTERVAL - (time.monotonic() - last_patrol))
+        changes = watcher.wait_for_changes(timeout)
+        if watcher.overflowed or time.monotonic() - last_patrol >= RESYNC_INTERVAL:
+            logger.info("Main: Running full police patrol to resync...")
+            watcher.overflowed = False
+            run_patrol(police_patrol)
+            last_patrol = time.monotonic()
+        elif changes:
+            logger.info(f"Main: {len(changes)} paths changed")
+            run_patrol(police_patrol_paths, changes)
+
 if __name__ == "__main__":
     main()
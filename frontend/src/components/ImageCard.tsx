@@ -3,6 +3,9 @@ import { Image } from "../types/image";
 import { imageCard } from "../styles/cleanseDashboardStyles";
 import { MEDIA_MOUNT_URL } from "../api/config"
 
+// Keep in step with BLUR_THRESHOLD in the backend's image model
+const BLUR_THRESHOLD = 50;
+
 interface Props {
     image: Image;
     onClick?: (image: Image) => void;
@@ -28,7 +31,7 @@ export function ImageCard({ image, onClick }: Props) {
                 ) : (
                     <span style={{ filter: "grayscale(100%)" }}>👤</span> // Black-and-white face icon
                 )}
-                {image.analysis.blur_score < 100 ? "⚠️ Blurry" : ""}
+                {image.analysis.blur_score < BLUR_THRESHOLD ? "⚠️ Blurry" : ""}
             </div>
         </div>
     );
@@ -1,86 +1,91 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useCallback } from "react";
 import { Image, DuplicateGroup } from "../types/image";
 
 import { CLEANSE_API_URL } from "../api/config"
 
-export function useAllImages(token: string) {
-    const [images, setImages] = useState<Image[]>([]);
-    const [loading, setLoading] = useState(true);
+// Rows per keyset page; further pages are only fetched when the user asks for them
+const IMAGE_PAGE_SIZE = 200;
 
-    useEffect(() => {
-        async function fetchData() {
-            setLoading(true);
-            const res = await fetch(`${CLEANSE_API_URL}/images`, {
-                headers: { Authorization: `Bearer ${token}` },
-            });
-            const data = await res.json();
-            // console.log("API Response in useAllImages:", data);
-            const imageArray = data.images || [];
-            const mappedData = imageArray.map((img: any) => ({
-                id: img.id,
-                path: img.path,
-                folder_id: 0, // Default or derived value
-                width: 0, // Default or derived value
-                height: 0, // Default or derived value
-                file_size: 0, // Default or derived value
-                analysis: {
-                    phash: img.hash || "",
-                    has_face: img.has_face,
-                    blur_score: img.blur_score,
-                    checksum: "", // Default or derived value
-                    orientation: 0, // Default or derived value
-                    tags: [], // Default or derived value
-                    duplicates: [], // Default or derived value
-                },
-            }));
-            // console.log("Mapped Data:", mappedData); // Debugging mapped data
-            setImages(mappedData);
-            setLoading(false);
-        }
-        fetchData();
-    }, [token]);
-
-    return { images, loading };
+function toImage(img: any): Image {
+    return {
+        id: img.id,
+        path: img.path,
+        folder_id: 0, // Default or derived value
+        width: 0, // Default or derived value
+        height: 0, // Default or derived value
+        file_size: 0, // Default or derived value
+        analysis: {
+            phash: img.hash || "",
+            has_face: img.has_face,
+            blur_score: img.blur_score,
+            checksum: "", // Default or derived value
+            orientation: 0, // Default or derived value
+            tags: [], // Default or derived value
+            duplicates: [], // Default or derived value
+        },
+    };
 }
 
-export function useNoFaceImages(token: string) {
+function useImagePages(token: string, endpoint: string) {
     const [images, setImages] = useState<Image[]>([]);
+    const [cursor, setCursor] = useState<number | null>(null);
     const [loading, setLoading] = useState(true);
+    const [loadingMore, setLoadingMore] = useState(false);
+
+    const fetchPage = useCallback(async (afterId: number | null) => {
+        const params = new URLSearchParams({ limit: String(IMAGE_PAGE_SIZE) });
+        if (afterId !== null) params.set("after_id", String(afterId));
+        const res = await fetch(`${CLEANSE_API_URL}${endpoint}?${params}`, {
+            headers: { Authorization: `Bearer ${token}` },
+        });
+        const data = await res.json();
+        return {
+            images: (data.images || []).map(toImage) as Image[],
+            nextCursor: (data.next_cursor ?? null) as number | null,
+        };
+    }, [token, endpoint]);
 
     useEffect(() => {
+        let cancelled = false;
         async function fetchData() {
             setLoading(true);
-            const res = await fetch(`${CLEANSE_API_URL}/images/no-face`, {
-                headers: { Authorization: `Bearer ${token}` },
-            });
-            const data = await res.json();
-            setImages(data);
+            const page = await fetchPage(null);
+            if (cancelled) return;
+            setImages(page.images);
+            setCursor(page.nextCursor);
             setLoading(false);
         }
         fetchData();
-    }, [token]);
+        return () => {
+            cancelled = true;
+        };
+    }, [fetchPage]);
 
-    return { images, loading };
+    const loadMore = useCallback(async () => {
+        if (cursor === null || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const page = await fetchPage(cursor);
+            setImages((previous) => [...previous, ...page.images]);
+            setCursor(page.nextCursor);
+        } finally {
+            setLoadingMore(false);
+        }
+    }, [cursor, loadingMore, fetchPage]);
+
+    return { images, loading, loadingMore, hasMore: cursor !== null, loadMore };
 }
 
-export function useBlurredImages(token: string) {
-    const [images, setImages] = useState<Image[]>([]);
-    const [loading, setLoading] = useState(true);
+export function useAllImages(token: string) {
+    return useImagePages(token, "/images");
+}
 
-    useEffect(() => {
-        async function fetchData() {
-            setLoading(true);
-            const res = await fetch(`${CLEANSE_API_URL}/images/blurred`, {
-                headers: { Authorization: `Bearer ${token}` },
-            });
-            const data = await res.json();
-            setImages(data);
-            setLoading(false);
-        }
-        fetchData();
-    }, [token]);
+export function useNoFaceImages(token: string) {
+    return useImagePages(token, "/images/no-face");
+}
 
-    return { images, loading };
+export function useBlurredImages(token: string) {
+    return useImagePages(token, "/images/blurred");
 }
 
 export function useDuplicates(token: string, imageId?: number) {
@@ -13,6 +13,7 @@ import {
     Typography,
     CircularProgress,
     Grid,
+    Button,
 } from "@mui/material";
 import { useTheme } from "@mui/material/styles";
 import { ImageCard } from "../components/ImageCard";
@@ -26,23 +27,27 @@ export default function CleanseDashboardPage({ token, role }: Props) {
     const [activeTab, setActiveTab] = useState<"all" | "duplicates" | "noFace" | "blurred">("all");
     const [selectedImage, setSelectedImage] = useState<Image | null>(null);
 
-    const { images: allImages, loading: loadingAll } = useAllImages(token);
-    const { images: noFaceImages, loading: loadingNoFace } = useNoFaceImages(token);
-    const { images: blurredImages, loading: loadingBlurred } = useBlurredImages(token);
+    const allPages = useAllImages(token);
+    const noFacePages = useNoFaceImages(token);
+    const blurredPages = useBlurredImages(token);
     const { images: duplicateImages, loading: loadingDuplicates } = useDuplicates(token, selectedImage?.id);
 
-    let imagesToShow = Array.isArray(allImages) ? allImages : [];
-    let loading = loadingAll;
-
+    // The paged listings fetch further pages only when "Load more" is clicked
+    let pages = allPages;
     if (activeTab === "noFace") {
-        imagesToShow = Array.isArray(noFaceImages) ? noFaceImages : [];
-        loading = loadingNoFace;
+        pages = noFacePages;
     } else if (activeTab === "blurred") {
-        imagesToShow = Array.isArray(blurredImages) ? blurredImages : [];
-        loading = loadingBlurred;
-    } else if (activeTab === "duplicates") {
+        pages = blurredPages;
+    }
+
+    let imagesToShow = pages.images;
+    let loading = pages.loading;
+    let hasMore = pages.hasMore;
+
+    if (activeTab === "duplicates") {
         imagesToShow = Array.isArray(duplicateImages) ? duplicateImages : [];
         loading = loadingDuplicates;
+        hasMore = false;
     }
 
     const handleImageClick = (image: Image) => {
@@ -95,6 +100,14 @@ export default function CleanseDashboardPage({ token, role }: Props) {
                     ))}
                 </Grid>
             )}
+
+            {!loading && hasMore && (
+                <Box sx={{ display: "flex", justifyContent: "center", mt: 2 }}>
+                    <Button variant="outlined" onClick={pages.loadMore} disabled={pages.loadingMore}>
+                        {pages.loadingMore ? "Loading..." : "Load more"}
+                    </Button>
+                </Box>
+            )}
         </Box>
     );
 }